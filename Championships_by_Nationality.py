@@ -1,15 +1,14 @@
 from dash import Dash, dcc, html, Input, Output
 import pandas as pd
 import plotly.express as px
-import requests
+
+from ergast import client
 
 
 def fetch_championship_data():
     titles = []
-    for year in range(1950, 2024):  # Fetch data from 1950 to 2023
-        url = f"http://ergast.com/api/f1/{year}/driverStandings/1.json"
-        response = requests.get(url)
-        data = response.json()
+    # Fetch data from 1950 to 2023
+    for year, data in client.fetch_seasons("{year}/driverStandings/1.json", range(1950, 2024)):
         try:
             winner = data['MRData']['StandingsTable']['StandingsLists'][0]['DriverStandings'][0]['Driver']
             titles.append({
@@ -18,7 +17,7 @@ def fetch_championship_data():
                 'Nationality': winner['nationality'],
                 'Country': winner.get('permanentNumber', "Unknown")  # Optional
             })
-        except (KeyError, IndexError):
+        except (KeyError, IndexError, TypeError):
             continue
     return pd.DataFrame(titles)
 
@@ -1,12 +1,11 @@
-import requests
 import pandas as pd
 import plotly.express as px
 
+from ergast import client
+
 # Fetch all circuits
 def fetch_circuits():
-    url = "http://ergast.com/api/f1/circuits.json?limit=1000"
-    response = requests.get(url)
-    data = response.json()
+    data = client.get_json("circuits.json", {'limit': 1000})
     circuits_data = data['MRData']['CircuitTable']['Circuits']
 
     circuits = []
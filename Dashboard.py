@@ -1,344 +1,124 @@
-import time
-import requests
+import os
 import pandas as pd
-from dash import Dash, dcc, html, Input, Output
+from flask import jsonify
+from dash import Dash, dcc, html, ctx, Input, Output, State, Patch
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime
+import plotly.io as pio
+
+import datasets
+import downsample
+from compression import compressor
+import figure_patch
+import lap_data
+import refresh
+from figure_cache import figures
+from response_json import encoder
+from static_figures import prebuilt
 
 # ====================================
-# Data Fetching Functions
+# Data
+#
+# Datasets load lazily on first use (see datasets.registry). By default a
+# background thread warms them so the layout is served before any data is
+# ready; F1_WARM_DATASETS=sync loads everything up front (used by gunicorn
+# --preload so workers inherit the loaded frames) and 'off' (or '0', as
+# it was first documented) loads only on demand.
+#
+# With F1_REFRESH_INTERVAL_MINUTES set, a background thread applies new
+# rounds and swaps in a new snapshot of the datasets. Callbacks that read
+# more than one dataset take a snapshot first so they never mix the two.
 # ====================================
 
-def fetch_championships(start_year=1950, end_year=2023):
-    championship_data = []
-    for year in range(start_year, end_year + 1):
-        url = f"http://ergast.com/api/f1/{year}/driverStandings/1.json"
-        response = requests.get(url)
-        time.sleep(0.5)
-        data = response.json()
-        try:
-            standings = data['MRData']['StandingsTable']['StandingsLists'][0]['DriverStandings'][0]
-            driver = standings['Driver']
-            championship_data.append({
-                'Year': year,
-                'Driver': f"{driver['givenName']} {driver['familyName']}",
-                'Nationality': driver['nationality']
-            })
-        except (IndexError, KeyError):
-            continue
-    return pd.DataFrame(championship_data)
-
-def fetch_championship_data():
-    titles = []
-    for year in range(1950, 2024):
-        url = f"http://ergast.com/api/f1/{year}/driverStandings/1.json"
-        response = requests.get(url)
-        data = response.json()
-        try:
-            winner = data['MRData']['StandingsTable']['StandingsLists'][0]['DriverStandings'][0]['Driver']
-            date_of_birth = datetime.strptime(winner['dateOfBirth'], '%Y-%m-%d')
-            # Calculate age at the end of the season
-            age = year - date_of_birth.year - ((datetime(year, 12, 31) < date_of_birth))
-            titles.append({
-                'Year': year,
-                'Driver': winner['givenName'] + " " + winner['familyName'],
-                'Nationality': winner['nationality'],
-                'Date of Birth': date_of_birth,
-                'Age': age
-            })
-        except (KeyError, IndexError):
-            continue
-    return pd.DataFrame(titles)
-
-def fetch_constructors_championships(start_year=1950, end_year=2024):
-    constructors_data = []
-    for year in range(start_year, end_year + 1):
-        url = f"http://ergast.com/api/f1/{year}/constructorStandings/1.json"
-        response = requests.get(url)
-        time.sleep(0.5)
-        data = response.json()
-        try:
-            standings = data['MRData']['StandingsTable']['StandingsLists'][0]
-            constructor = standings['ConstructorStandings'][0]['Constructor']
-            constructors_data.append({
-                'Year': year,
-                'Constructor': constructor['name']
-            })
-        except (IndexError, KeyError):
-            continue
-    return pd.DataFrame(constructors_data)
-
-def fetch_grand_prix_winners(start_year=1950, end_year=2024):
-    winners_data = []
-    for year in range(start_year, end_year + 1):
-        url = f"http://ergast.com/api/f1/{year}/results/1.json?limit=1000"
-        response = requests.get(url)
-        time.sleep(0.5)
-        data = response.json()
-        try:
-            races = data['MRData']['RaceTable']['Races']
-            for race in races:
-                driver = race['Results'][0]['Driver']
-                driver_name = f"{driver['givenName']} {driver['familyName']}"
-                winners_data.append({
-                    'Year': year,
-                    'Race': race['raceName'],
-                    'Driver': driver_name
-                })
-        except KeyError:
-            continue
-    return pd.DataFrame(winners_data)
-
-def fetch_circuits():
-    url = "http://ergast.com/api/f1/circuits.json?limit=1000"
-    response = requests.get(url)
-    data = response.json()
-    circuits_data = data['MRData']['CircuitTable']['Circuits']
-    circuits = []
-    for c in circuits_data:
-        loc = c['Location']
-        circuits.append({
-            'CircuitName': c['circuitName'],
-            'Latitude': float(loc['lat']),
-            'Longitude': float(loc['long']),
-            'Locality': loc['locality'],
-            'Country': loc['country']
-        })
-    return pd.DataFrame(circuits)
-
-def fetch_race_results():
-    data = []
-    for year in range(1950, 2024):
-        url = f"http://ergast.com/api/f1/{year}/results/1.json?limit=1000"
-        response = requests.get(url)
-        results = response.json()
-        try:
-            races = results['MRData']['RaceTable']['Races']
-            for race in races:
-                winner = race['Results'][0]['Driver']
-                data.append({
-                    'year': int(race['season']),
-                    'circuitId': race['Circuit']['circuitId'],
-                    'full_name': winner['givenName'] + " " + winner['familyName'],
-                    'surname': winner['familyName'],
-                    'name': winner['givenName'] + " " + winner['familyName'],
-                    'positionOrder': 1
-                })
-        except (KeyError, IndexError):
-            continue
-    return pd.DataFrame(data)
-
-def compute_constructors_stats(data):
-    return (
-        data.groupby('Constructor')
-        .agg(
-            Titles=('Year', 'count'),
-            Years=('Year', lambda x: ', '.join(map(str, sorted(x.unique()))))
-        )
-        .reset_index()
-    )
+data = datasets.registry
+WARM_DATASETS = os.environ.get('F1_WARM_DATASETS', 'background')
+if WARM_DATASETS == 'sync':
+    data.warm(datasets.WARM_ORDER, background=False)
+elif WARM_DATASETS not in ('off', '0'):
+    data.warm(datasets.WARM_ORDER)
 
-def compute_drivers_stats(data):
-    return (
-        data.groupby('Driver')
-        .agg(
-            Titles=('Year', 'count'),
-            Years=('Year', lambda x: ', '.join(map(str, sorted(x.unique()))))
-        )
-        .reset_index()
-    )
+# Started from __main__ below, or per worker by gunicorn's post_fork hook
+refresher = refresh.RefreshScheduler(data)
 
-def fetch_driver_standings():
-    data = []
-    for year in range(1950, 2024):
-        url = f"http://ergast.com/api/f1/{year}/driverStandings.json?limit=1000"
-        response = requests.get(url)
-        if response.status_code != 200:
-            continue
-        standings = response.json().get('MRData', {}).get('StandingsTable', {}).get('StandingsLists', [])
-        for season in standings:
-            season_year = season['season']
-            for driver_standing in season['DriverStandings']:
-                driver = driver_standing['Driver']
-                driver_name = f"{driver['givenName']} {driver['familyName']}"
-                points = float(driver_standing['points'])
-                data.append({
-                    'Year': int(season_year),
-                    'Driver': driver_name,
-                    'Points': points
-                })
-    return pd.DataFrame(data)
-
-def fetch_race_list(year):
-    url = f"http://ergast.com/api/f1/{year}.json"
-    response = requests.get(url)
-    if response.status_code != 200:
-        return []
-    data = response.json()
-    races = data.get('MRData', {}).get('RaceTable', {}).get('Races', [])
-    return [{'label': race['raceName'], 'value': int(race['round'])} for race in races]
-
-def fetch_lap_times(year, race):
-    lap_times = []
-    offset = 0
-    limit = 100
-    while True:
-        url = f"http://ergast.com/api/f1/{year}/{race}/laps.json?limit={limit}&offset={offset}"
-        response = requests.get(url)
-        if response.status_code != 200:
-            break
-
-        data = response.json()
-        races = data.get('MRData', {}).get('RaceTable', {}).get('Races', [])
-        if not races:
-            break
-
-        laps = races[0].get('Laps', [])
-        if laps:
-            for lap in laps:
-                lap_number = int(lap['number'])
-                for timing in lap.get('Timings', []):
-                    driver_id = timing['driverId']
-                    lap_time = timing['time']
-                    minutes, seconds = map(float, lap_time.split(":"))
-                    total_milliseconds = int((minutes * 60 + seconds) * 1000)
-
-                    lap_times.append({
-                        'Driver': driver_id,
-                        'Lap': lap_number,
-                        'Milliseconds': total_milliseconds,
-                        'Time': lap_time
-                    })
-
-        total_laps = int(data['MRData']['total'])
-        offset += limit
-        if offset >= total_laps:
-            break
-
-    return pd.DataFrame(lap_times)
-
-# Qualifying vs Race Results
-def fetch_qualifying_and_race_results(start_year=1950, end_year=2024):
-    data = []
-    for year in range(start_year, end_year + 1):
-        url = f"http://ergast.com/api/f1/{year}/results.json?limit=1000"
-        response = requests.get(url)
-        time.sleep(0.5)  # Avoid API rate limits
-        year_data = response.json()
-
-        try:
-            races = year_data['MRData']['RaceTable']['Races']
-            for race in races:
-                race_name = race['raceName']
-                round_number = int(race['round'])
-                for result in race['Results']:
-                    driver = result['Driver']
-                    driver_name = f"{driver['givenName']} {driver['familyName']}"
-                    qualifying_position = int(result['grid'])
-                    race_position = int(result['position'])
-
-                    data.append({
-                        'Year': int(year),
-                        'Round': round_number,
-                        'Race': race_name,
-                        'Driver': driver_name,
-                        'Qualifying Position': qualifying_position,
-                        'Race Position': race_position
-                    })
-        except KeyError:
-            continue
-
-    return pd.DataFrame(data)
-
-def ensure_all_rounds_for_driver(data, year, driver):
-    year_data = data[data['Year'] == year]
-    max_round = year_data['Round'].max()
-    all_rounds = list(range(1, max_round + 1))
-
-    full_rounds = pd.DataFrame({
-        'Year': year,
-        'Round': all_rounds,
-        'Driver': driver
-    })
 
-    driver_data = year_data[year_data['Driver'] == driver]
-    return full_rounds.merge(driver_data, on=['Year', 'Round', 'Driver'], how='left')
+def data_version():
+    return data['data_version']
+
+
+# Bump when an interactive chart below changes, so figures drawn by older
+# code are not served from cache/figures.sqlite after a deploy
+FIGURE_REVISION = 1
 
-# ====================================
-# Fetch and process data
-# ====================================
 
-championship_data = fetch_championships()
-constructor_data = fetch_constructors_championships()
-grand_prix_winners = fetch_grand_prix_winners()
-circuit_data = fetch_circuits()
-driver_championship_data = fetch_championship_data()
-heatmap_data = fetch_race_results()
-standings_data = fetch_driver_standings()
+def figure_version():
+    return f"{data_version()}/{FIGURE_REVISION}"
 
-driver_stats_by_nationality = championship_data.groupby('Nationality').agg(
-    Titles=('Year', 'count'),
-    Drivers=('Driver', 'nunique')
-).reset_index()
 
-constructors_stats = compute_constructors_stats(constructor_data)
-drivers_stats = compute_drivers_stats(championship_data)
+def lap_figure_version():
+    # Rebuilding the lap store changes where a race's laps come from
+    return f"{figure_version()}/{lap_data.lap_store_version()}"
 
-# Youngest and Oldest F1 Champions
-first_wins = driver_championship_data.sort_values(by='Year').drop_duplicates(subset='Driver', keep='first')
-sorted_data = first_wins.sort_values(by='Age')
-youngest_champions = sorted_data.head(10)
-oldest_champions = sorted_data.tail(10)
 
-# Unique drivers for heatmap
-all_drivers = sorted(heatmap_data['full_name'].unique())
+def has_traces(result):
+    # Empty charts may come from a failed fetch; they are redrawn next time
+    return len(result[0].data) > 0
 
-# Qualifying vs Race Data
-qualifying_race_data = fetch_qualifying_and_race_results(1950, 2024)
-qual_default_year = qualifying_race_data['Year'].max()
+
+# Static charts drawn by `python static_figures.py` (or on first use)
+prebuilt.preload()
 
 # ====================================
 # Initialize Dash app with a dark Bootstrap theme
 # ====================================
 app = Dash(__name__, external_stylesheets=[dbc.themes.CYBORG])
 
+# WSGI entry point for gunicorn (see Procfile and gunicorn.conf.py)
+server = app.server
+compressor.init_app(server)
+encoder.install()
+
+
+@server.route('/metrics')
+def metrics():
+    return jsonify({
+        'refresh': refresher.metrics(),
+        'figure_cache': figures.metrics(),
+        'encoding': encoder.metrics(),
+        'compression': compressor.metrics()
+    })
+
 # ====================================
 # Layout
+#
+# Each section's callbacks wait until it first scrolls into view (an
+# IntersectionObserver set up in the browser sets its `<name>-visible`
+# store), so the page loads without drawing charts nobody has looked at.
 # ====================================
+def deferred_section(name, *rows):
+    return html.Div([dcc.Store(id=f'{name}-visible'), *rows], id=f'{name}-section', className='deferred-section')
+
 app.layout = dbc.Container(fluid=True, children=[
+    # Browser window width, for sizing the line charts' point budget
+    dcc.Store(id='viewport-width'),
+    dcc.Store(id='deferred-sections'),
+
     dbc.Row([
         dbc.Col(html.H1("F1 Dashboard", className="text-center my-4"), width=12)
     ]),
 
     # World Drivers Championship
-    dbc.Row([
+    deferred_section('championship', dbc.Row([
         dbc.Col([
             html.H2("World Drivers Championship", className="my-4"),
-            dcc.Graph(
-                id='championship-bar-chart',
-                # Add template='plotly_dark' to the figure
-                figure=px.bar(
-                    drivers_stats.sort_values(by='Titles', ascending=False),
-                    x='Driver',
-                    y='Titles',
-                    text='Titles',
-                    title='World Drivers Championships (1950-2024)',
-                    labels={'Titles': 'Number of Titles', 'Driver': 'Driver'},
-                    color='Titles',
-                    hover_data={'Years': True},
-                    color_continuous_scale='Viridis',
-                    category_orders={'Driver': drivers_stats.sort_values(by='Titles', ascending=False)['Driver']},
-                    template='plotly_dark'
-                ).update_layout(xaxis_tickangle=-45, margin={'l': 50, 'r': 50, 't': 50, 'b': 150})
-            )
+            dcc.Loading(dcc.Graph(id='championship-bar-chart'))
         ], width=12),
-    ], className="my-4"),
+    ], className="my-4")),
 
     # Driver Championships by Nationality
 # Driver Championships by Nationality
-dbc.Row([
+deferred_section('nationality', dbc.Row([
     dbc.Col([
         html.H2("Driver Championships by Nationality", className="my-3"),  # Reduced from my-4 to my-3
         dcc.Dropdown(
@@ -351,89 +131,42 @@ dbc.Row([
             clearable=False,
             style={'width': '50%', 'margin': '0 auto', 'color': '#000'}
         ),
-        dcc.Graph(
+        dcc.Store(id='nationality-hierarchy'),
+        dcc.Loading(dcc.Graph(
             id='nationality-chart',
             style={'height': '600px', 'width': '85%', 'margin': 'auto'}
-        )
+        ))
     ], width=12),
-], className="my-3"),  # Reduced outer row spacing from my-4 to my-3
+], className="my-3")),  # Reduced outer row spacing from my-4 to my-3
 
 
     # Circuits
-    dbc.Row([
+    deferred_section('circuits', dbc.Row([
         dbc.Col([
             html.H2("F1 Circuits Around the World", className="my-4"),
-            dcc.Graph(
-                id='circuits-map',
-                figure=px.scatter_geo(
-                    circuit_data,
-                    lat='Latitude',
-                    lon='Longitude',
-                    hover_name='CircuitName',
-                    hover_data={'Locality': True, 'Country': True},
-                    projection="natural earth",
-                    title="Formula 1 Circuits Around the World",
-                    template='plotly_dark'
-                ).update_layout(margin={"r":0,"t":40,"l":0,"b":0})
-            )
+            dcc.Loading(dcc.Graph(id='circuits-map'))
         ], width=12),
-    ], className="my-4"),
+    ], className="my-4")),
 
     # Grand Prix Winners
-    dbc.Row([
+    deferred_section('grand-prix-winners', dbc.Row([
         dbc.Col([
             html.H2("F1 Grand Prix Winners", className="my-4"),
-            dcc.Graph(
-                id='grand-prix-winners',
-                figure=px.scatter(
-                    grand_prix_winners,
-                    x='Year',
-                    y='Race',
-                    color='Driver',
-                    hover_data={'Driver': True, 'Year': True, 'Race': True},
-                    title='Formula 1 Grand Prix Winners (1950-2024)',
-                    labels={'Race': 'Grand Prix', 'Driver': 'Winner'},
-                    template='plotly_dark'
-                ).update_layout(
-                    height=1200,
-                    yaxis=dict(
-                        title='Grand Prix',
-                        tickmode='linear',
-                        tickfont=dict(size=8),
-                        automargin=True
-                    ),
-                    xaxis=dict(title='Year'),
-                    margin={'l': 150, 'r': 50, 't': 50, 'b': 50}
-                )
-            )
+            dcc.Store(id='grand-prix-winners-codes'),
+            dcc.Loading(dcc.Graph(id='grand-prix-winners'))
         ], width=12),
-    ], className="my-4"),
+    ], className="my-4")),
 
     # Constructors Championships
-    dbc.Row([
+    deferred_section('constructors', dbc.Row([
         dbc.Col([
             html.H2("World Constructors Championships", className="my-4"),
-            dcc.Graph(
-                id='constructors-championships',
-                figure=px.bar(
-                    constructors_stats.sort_values(by='Titles', ascending=False),
-                    x='Constructor',
-                    y='Titles',
-                    text='Titles',
-                    title='World Constructors Championships (1950-2024)',
-                    labels={'Titles': 'Number of Titles', 'Constructor': 'Constructor'},
-                    hover_data={'Years': True},
-                    color='Titles',
-                    color_continuous_scale='Cividis',
-                    category_orders={'Constructor': constructors_stats.sort_values(by='Titles', ascending=False)['Constructor']},
-                    template='plotly_dark'
-                ).update_layout(xaxis_tickangle=-45, margin={'l': 50, 'r': 50, 't': 50, 'b': 150})
-            )
+            dcc.Loading(dcc.Graph(id='constructors-championships'))
         ], width=12),
-    ], className="my-4"),
+    ], className="my-4")),
 
     # Youngest and Oldest Champions
-    dbc.Row([
+    deferred_section('champion-ages', dbc.Row([
         dbc.Col([
             html.H2("Youngest and Oldest F1 Drivers' Champions", className="my-4"),
         ], width=12)
@@ -441,48 +174,47 @@ dbc.Row([
     dbc.Row([
         dbc.Col([
             html.H3( className="my-2"),
-            dcc.Graph(id='youngest-bar-chart')
+            dcc.Loading(dcc.Graph(id='youngest-bar-chart'))
         ], md=6),
         dbc.Col([
             html.H3( className="my-2"),
-            dcc.Graph(id='oldest-bar-chart')
+            dcc.Loading(dcc.Graph(id='oldest-bar-chart'))
         ], md=6),
-    ], className="my-4"),
+    ], className="my-4")),
 
     # Heatmap Section
-    dbc.Row([
+    deferred_section('heatmap', dbc.Row([
         dbc.Col([
             html.H2("F1 Driver Wins Heatmap", className="my-4"),
             html.Label("Select Driver(s):"),
             dcc.Dropdown(
                 id='driver-selector',
-                options=[{'label': driver, 'value': driver} for driver in all_drivers],
-                value=all_drivers[:5],
                 multi=True,
                 clearable=True,
                 style={'width':'100%', 'color':'#000'}
             ),
-            dcc.Graph(id='heatmap')
+            dcc.Store(id='heatmap-drawn'),
+            dcc.Loading(dcc.Graph(id='heatmap'))
         ], width=12),
-    ], className="my-4"),
+    ], className="my-4")),
 
     # Driver Standings Progression
-    dbc.Row([
+    deferred_section('standings', dbc.Row([
         dbc.Col([
             html.H2("Driver Standings Progression Over the Years", className="text-center my-4"),
             dcc.Dropdown(
                 id='driver-selection',
-                options=[{'label': driver, 'value': driver} for driver in standings_data['Driver'].unique()],
                 multi=True,
                 placeholder="Select Driver(s)",
                 style={'margin-bottom': '20px', 'width': '100%', 'margin': '0 auto', 'color':'#000'}
             ),
-            dcc.Graph(id='driver-standings-chart', style={'height': '700px'})
+            dcc.Store(id='driver-standings-drawn'),
+            dcc.Loading(dcc.Graph(id='driver-standings-chart', style={'height': '700px'}))
         ], width=12),
-    ], className="my-4"),
+    ], className="my-4")),
 
     # F1 Lap Time Analysis
-    dbc.Row([
+    deferred_section('lap-times', dbc.Row([
         dbc.Col([
             html.H2("F1 Lap Time Analysis", className="text-center my-4"),
             dbc.Row([
@@ -508,12 +240,12 @@ dbc.Row([
                 ], md=3)
             ], className="my-2"),
             html.Div(id='fastest-lap-summary', style={'margin': '20px', 'fontSize': '16px'}),
-            dcc.Graph(id='lap-times-chart', style={'height': '600px'})
+            dcc.Loading(dcc.Graph(id='lap-times-chart', style={'height': '600px'}))
         ], width=12),
-    ], className="my-4"),
+    ], className="my-4")),
 
     # Qualifying vs Race Performance
-    dbc.Row([
+    deferred_section('qualifying', dbc.Row([
         dbc.Col([
             html.H2("Qualifying vs Race Performance", className="text-center my-4"),
             dbc.Row([
@@ -521,8 +253,6 @@ dbc.Row([
                     html.Label("Select Year:"),
                     dcc.Dropdown(
                         id='qual-year-dropdown',
-                        options=[{'label': str(y), 'value': y} for y in sorted(qualifying_race_data['Year'].unique())],
-                        value=qual_default_year,
                         clearable=True,
                         placeholder="Select a year",
                         style={'width': '100%', 'color':'#000'}
@@ -538,9 +268,9 @@ dbc.Row([
                     ),
                 ], md=6),
             ], className="my-2"),
-            dcc.Graph(id='qualifying-vs-race-chart', style={'height': '600px'})
+            dcc.Loading(dcc.Graph(id='qualifying-vs-race-chart', style={'height': '600px'}))
         ], width=12)
-    ], className="my-4")
+    ], className="my-4"))
 ])
 
 # ====================================
@@ -548,169 +278,428 @@ dbc.Row([
 # ====================================
 
 @app.callback(
+    Output('championship-bar-chart', 'figure'),
+    Input('championship-visible', 'data'),
+    prevent_initial_call=True
+)
+def update_championship_chart(_):
+    return prebuilt.get('championship', data.snapshot())
+
+@app.callback(
+    Output('circuits-map', 'figure'),
+    Input('circuits-visible', 'data'),
+    prevent_initial_call=True
+)
+def update_circuits_map(_):
+    return prebuilt.get('circuits', data.snapshot())
+
+@app.callback(
+    Output('grand-prix-winners-codes', 'data'),
+    Input('grand-prix-winners-visible', 'data'),
+    prevent_initial_call=True
+)
+def update_grand_prix_winners(_):
+    return prebuilt.get('grand_prix_winners', data.snapshot())
+
+# The winners chart arrives with integer driver and race codes; names for
+# the hover and the legend (one empty trace per driver, in its colour) are
+# looked up here rather than sent with every point
+app.clientside_callback(
+    """
+    function(figure) {
+        if (!figure) {
+            return window.dash_clientside.no_update;
+        }
+        const points = figure.data[0];
+        const drivers = points.meta.drivers;
+        const races = figure.layout.yaxis.ticktext;
+        const colours = figure.layout.template.layout.colorway;
+        const legend = drivers.map((driver, i) => ({
+            type: 'scattergl', mode: 'markers', x: [null], y: [null], name: driver,
+            marker: {color: colours[i % colours.length]}, hoverinfo: 'skip'
+        }));
+        return Object.assign({}, figure, {
+            data: [Object.assign({}, points, {
+                text: points.customdata.map(code => drivers[code]),
+                customdata: points.y.map(row => races[row])
+            })].concat(legend)
+        });
+    }
+    """,
+    Output('grand-prix-winners', 'figure'),
+    Input('grand-prix-winners-codes', 'data')
+)
+
+@app.callback(
+    Output('constructors-championships', 'figure'),
+    Input('constructors-visible', 'data'),
+    prevent_initial_call=True
+)
+def update_constructors_chart(_):
+    return prebuilt.get('constructors', data.snapshot())
+
+@app.callback(
+    Output('nationality-hierarchy', 'data'),
+    Input('nationality-visible', 'data'),
+    prevent_initial_call=True
+)
+def update_nationality_hierarchy(_):
+    return prebuilt.get('nationality', data.snapshot())
+
+# Sunburst and treemap share the hierarchy, so switching only changes the
+# trace type, in the browser
+app.clientside_callback(
+    """
+    function(chartType, figure) {
+        if (!figure) {
+            return window.dash_clientside.no_update;
+        }
+        return Object.assign({}, figure, {
+            data: figure.data.map(trace => Object.assign({}, trace, {type: chartType}))
+        });
+    }
+    """,
     Output('nationality-chart', 'figure'),
-    Input('nationality-chart-type', 'value')
+    Input('nationality-chart-type', 'value'),
+    Input('nationality-hierarchy', 'data')
 )
-def update_nationality_chart(chart_type):
-    if chart_type == 'sunburst':
-        fig = px.sunburst(
-            championship_data,
-            path=['Nationality', 'Driver', 'Year'],
-            title="Driver Championships by Nationality",
-            hover_data={'Year': True},
-            template='plotly_dark'
-        )
-    else:
-        fig = px.treemap(
-            championship_data,
-            path=['Nationality', 'Driver', 'Year'],
-            title="Driver Championships by Nationality",
-            hover_data={'Year': True},
-            template='plotly_dark'
-        )
-    return fig
 
 @app.callback(
     [Output('youngest-bar-chart', 'figure'),
      Output('oldest-bar-chart', 'figure')],
-    Input('youngest-bar-chart', 'id')
+    Input('champion-ages-visible', 'data'),
+    prevent_initial_call=True
 )
 def update_charts(_):
-    youngest_bar_fig = px.bar(
-        youngest_champions,
-        x='Age',
-        y='Driver',
-        orientation='h',
-        color='Nationality',
-        text='Year',
-        title="Top 10 Youngest F1 Champions",
-        hover_data={'Driver': True, 'Age': True, 'Year': True, 'Nationality': True},
-        template='plotly_dark'
-    )
-    youngest_bar_fig.update_layout(
-        yaxis=dict(categoryorder='total ascending'),
-        xaxis_title="Age",
-        yaxis_title="Driver"
-    )
+    snapshot = data.snapshot()
+    return prebuilt.get('youngest_champions', snapshot), prebuilt.get('oldest_champions', snapshot)
 
-    oldest_bar_fig = px.bar(
-        oldest_champions,
-        x='Age',
-        y='Driver',
-        orientation='h',
-        color='Nationality',
-        text='Year',
-        title="Top 10 Oldest F1 Champions",
-        hover_data={'Driver': True, 'Age': True, 'Year': True, 'Nationality': True},
-        template='plotly_dark'
-    )
-    oldest_bar_fig.update_layout(
-        yaxis=dict(categoryorder='total ascending'),
-        xaxis_title="Age",
-        yaxis_title="Driver"
-    )
+# The driver dropdowns are searched on the server: each keystroke gets the
+# best DRIVER_OPTION_LIMIT matches, plus the drivers already selected so
+# they keep their labels, rather than every driver up front
+DRIVER_OPTION_LIMIT = 20
 
-    return youngest_bar_fig, oldest_bar_fig
+def driver_options(index, search_value, selected_drivers):
+    selected_drivers = selected_drivers or []
+    matches = index.search(search_value, DRIVER_OPTION_LIMIT)
+    drivers = selected_drivers + [driver for driver in matches if driver not in selected_drivers]
+    return [{'label': driver, 'value': driver} for driver in drivers]
 
 @app.callback(
-    Output('heatmap', 'figure'),
-    Input('driver-selector', 'value')
+    Output('driver-selector', 'value'),
+    Input('heatmap-visible', 'data'),
+    prevent_initial_call=True
 )
-def update_driver_wins_heatmap(selected_drivers):
-    if not selected_drivers or len(selected_drivers) == 0:
-        filtered_data = heatmap_data
-    else:
-        filtered_data = heatmap_data[heatmap_data['full_name'].isin(selected_drivers)]
+def update_heatmap_default_drivers(_):
+    return data['all_drivers'][:5]
+
+@app.callback(
+    Output('driver-selector', 'options'),
+    Input('driver-selector', 'search_value'),
+    Input('driver-selector', 'value'),
+    prevent_initial_call=True
+)
+def update_heatmap_driver_options(search_value, selected_drivers):
+    return driver_options(data['winner_index'], search_value, selected_drivers)
 
-    if filtered_data.empty:
-        return px.imshow([], title="No Data Available", template='plotly_dark')
+# The heatmap and standings callbacks below redraw the whole figure only
+# when they have to; adding or removing a driver sends a Patch with just
+# that driver's row or trace (see figure_patch)
 
-    fig = px.density_heatmap(
-        filtered_data,
-        x='year',
-        y='full_name',
-        z='positionOrder',
-        color_continuous_scale=px.colors.sequential.Plasma,
-        title='Driver Wins by Year and Race',
-        labels={
-            'year': 'Year',
-            'full_name': 'Driver',
-            'positionOrder': 'Wins'
-        },
-        hover_data={'name': True, 'year': True, 'circuitId': True},
-        template='plotly_dark'
-    )
+def heatmap_rows(wins, selected_drivers):
+    # Most wins at the top
+    drivers, counts = wins.select(selected_drivers or wins.drivers)
+    order = counts.sum(axis=1).argsort(kind='stable')
+    return [drivers[i] for i in order], counts[order]
+
+@app.callback(
+    Output('heatmap', 'figure'),
+    Output('heatmap-drawn', 'data'),
+    Input('driver-selector', 'value'),
+    State('heatmap-drawn', 'data'),
+    prevent_initial_call=True
+)
+def update_driver_wins_heatmap(selected_drivers, drawn):
+    snapshot = data.snapshot()
+    if selected_drivers and drawn and drawn['version'] == snapshot['data_version']:
+        drivers, counts = heatmap_rows(snapshot['wins_matrix'], sorted(selected_drivers))
+        if drivers and figure_patch.worth_patching(drawn['drivers'], drivers):
+            rows = dict(zip(drivers, counts.tolist()))
+            fig = Patch()
+            figure_patch.patch_list(fig['data'][0]['y'], drawn['drivers'], drivers, lambda driver: driver)
+            figure_patch.patch_list(fig['data'][0]['z'], drawn['drivers'], drivers, rows.get)
+            return fig, dict(drawn, drivers=drivers)
+    # Selection order does not change the heatmap, so one cached figure
+    # serves every order
+    return driver_wins_heatmap(sorted(selected_drivers) if selected_drivers else selected_drivers)
+
+@figures.memoize(figure_version)
+def driver_wins_heatmap(selected_drivers):
+    snapshot = data.snapshot()
+    drivers, counts = heatmap_rows(snapshot['wins_matrix'], selected_drivers)
+
+    if not drivers:
+        return go.Figure(layout=dict(title="No Data Available", template='plotly_dark')), None
+
+    fig = go.Figure(go.Heatmap(
+        x=snapshot['wins_matrix'].years,
+        y=drivers,
+        z=counts,
+        colorscale=px.colors.sequential.Plasma,
+        colorbar=dict(title='Wins'),
+        hovertemplate='Driver: %{y}<br>Year: %{x}<br>Wins: %{z}<extra></extra>'
+    ))
 
     fig.update_layout(
-        coloraxis_colorbar=dict(title='Wins'),
+        title='Driver Wins by Year and Race',
+        template='plotly_dark',
         xaxis=dict(title='Year', tickmode='linear'),
-        yaxis=dict(title='Driver', categoryorder='total ascending'),
+        yaxis=dict(title='Driver'),
         margin=dict(l=50, r=50, t=50, b=50)
     )
 
-    return fig
+    return fig, {'version': snapshot['data_version'], 'drivers': drivers}
 
 @app.callback(
-    Output('driver-standings-chart', 'figure'),
-    [Input('driver-selection', 'value')]
+    Output('driver-selection', 'options'),
+    Input('driver-selection', 'search_value'),
+    Input('driver-selection', 'value'),
+    Input('standings-visible', 'data'),
+    prevent_initial_call=True
 )
-def update_driver_standings_chart(selected_drivers):
-    filtered_data = standings_data
-    if selected_drivers:
-        filtered_data = standings_data[standings_data['Driver'].isin(selected_drivers)]
+def update_standings_driver_options(search_value, selected_drivers, _):
+    return driver_options(data['standings_driver_index'], search_value, selected_drivers)
 
-    fig = px.line(
-        filtered_data,
+app.clientside_callback(
+    "function(_) { return window.innerWidth; }",
+    Output('viewport-width', 'data'),
+    Input('viewport-width', 'id')
+)
+
+# Marks each section visible the first time it comes within 200 px of the
+# window; retries until the layout has rendered the sections
+app.clientside_callback(
+    """
+    function(_) {
+        function observe() {
+            const sections = document.querySelectorAll('.deferred-section');
+            if (!sections.length) {
+                setTimeout(observe, 50);
+                return;
+            }
+            const observer = new IntersectionObserver(entries => {
+                entries.filter(entry => entry.isIntersecting).forEach(entry => {
+                    observer.unobserve(entry.target);
+                    const name = entry.target.id.replace(/-section$/, '');
+                    window.dash_clientside.set_props(name + '-visible', {data: true});
+                });
+            }, {rootMargin: '200px'});
+            sections.forEach(section => observer.observe(section));
+        }
+        observe();
+        return window.dash_clientside.no_update;
+    }
+    """,
+    Output('deferred-sections', 'data'),
+    Input('deferred-sections', 'id')
+)
+
+def zoomed_range(graph_id, relayout_data, rows, max_points):
+    # None (the full chart) unless this call comes from zooming `graph_id`.
+    # A chart drawn with all of its points (`rows()`) has nothing more to
+    # show zoomed in, so the browser zooms it on its own
+    if ctx.triggered_id != graph_id:
+        return None
+    if not downsample.changes_x(relayout_data) or not downsample.thins(rows(), 'Driver', max_points):
+        raise PreventUpdate
+    return downsample.zoom_range(relayout_data)
+
+STANDINGS_COLOURS = pio.templates['plotly_dark'].layout.colorway
+
+def standings_colour(rows, driver):
+    # Each driver keeps one colour whoever else is selected, so a trace
+    # patched in looks the same as in a full redraw
+    categories = rows['Driver'].cat.categories
+    return STANDINGS_COLOURS[categories.get_loc(driver) % len(STANDINGS_COLOURS)]
+
+def standings_lines(rows, points, x_range=None):
+    colours = {driver: standings_colour(rows, driver) for driver in rows['Driver'].unique()}
+    rows = datasets.resolve_labels(rows)
+    return px.line(
+        downsample.downsample(rows, 'Year', 'Points', 'Driver', points, x_range),
         x='Year',
         y='Points',
         color='Driver',
+        color_discrete_map=colours,
         title='Driver Standings Progression Over the Years',
         labels={'Year': 'Year', 'Points': 'Points', 'Driver': 'Driver'},
         template='plotly_dark'
     )
 
+def standings_trace(driver, rows, points):
+    # The trace standings_lines draws for one driver, without building a
+    # px figure around it
+    colour = standings_colour(rows, driver)
+    rows = downsample.downsample(datasets.resolve_labels(rows), 'Year', 'Points', 'Driver', points)
+    return dict(
+        type='scatter', mode='lines', name=driver, legendgroup=driver, showlegend=True,
+        line=dict(color=colour, dash='solid'), marker=dict(symbol='circle'), orientation='v',
+        x=rows['Year'].to_numpy(), y=rows['Points'].to_numpy(), xaxis='x', yaxis='y',
+        hovertemplate=f"Driver={driver}<br>Year=%{{x}}<br>Points=%{{y}}<extra></extra>"
+    )
+
+def standings_annotation(driver, rows, latest_year):
+    # Driver name at their points in the latest season, if they raced in it
+    rows = datasets.resolve_labels(rows)
+    latest_data = rows[rows['Year'] == latest_year]
+    if latest_data.empty:
+        return None
+    return dict(x=latest_year, y=latest_data['Points'].values[0], text=driver, showarrow=False)
+
+def standings_rows(selected_drivers):
+    snapshot = data.snapshot()
+    if selected_drivers:
+        return snapshot['standings_by_driver'].select(selected_drivers)
+    return snapshot['standings_data']
+
+@app.callback(
+    Output('driver-standings-chart', 'figure'),
+    Output('driver-standings-drawn', 'data'),
+    [Input('driver-selection', 'value'),
+     Input('driver-standings-chart', 'relayoutData'),
+     Input('viewport-width', 'data'),
+     Input('standings-visible', 'data')],
+    State('driver-standings-drawn', 'data'),
+    prevent_initial_call=True
+)
+def update_driver_standings_chart(selected_drivers, relayout_data, width, visible, drawn):
+    if not visible:
+        raise PreventUpdate
+    max_points = downsample.point_budget(width)
+    x_range = zoomed_range(
+        'driver-standings-chart', relayout_data, lambda: standings_rows(selected_drivers), max_points
+    )
+    if (ctx.triggered_id == 'driver-selection' and selected_drivers and drawn
+            and drawn['version'] == data_version() and drawn['max_points'] == max_points):
+        patched = patch_driver_standings(sorted(selected_drivers), drawn)
+        if patched is not None:
+            return patched
+    return driver_standings_figure(
+        sorted(selected_drivers) if selected_drivers else selected_drivers, x_range, max_points
+    )
+
+def patch_driver_standings(selected_drivers, drawn):
+    snapshot = data.snapshot()
+    standings_by_driver = snapshot['standings_by_driver']
+    latest_year = snapshot['standings_data']['Year'].max()
+
+    rows = standings_by_driver.select(selected_drivers)
+    drivers = list(rows['Driver'].unique())
+    if not drivers or not figure_patch.worth_patching(drawn['drivers'], drivers):
+        return None
+    # The budget is shared between the drivers, so a different number of
+    # them may cut the traces already drawn differently
+    points = downsample.series_points(drawn['max_points'], len(drivers))
+    if (points != drawn['series_points']
+            and downsample.longest_series(rows, 'Driver') > min(points, drawn['series_points'])):
+        return None
+    added = {driver: standings_by_driver.get(driver) for driver in drivers if driver not in drawn['drivers']}
+    annotations = {driver: standings_annotation(driver, rows, latest_year) for driver, rows in added.items()}
+    annotated = [driver for driver in drivers if driver in drawn['annotated'] or annotations.get(driver)]
+
+    fig = Patch()
+    figure_patch.patch_list(
+        fig['data'], drawn['drivers'], drivers,
+        lambda driver: standings_trace(driver, added[driver], points)
+    )
+    if drawn['annotated']:
+        figure_patch.patch_list(fig['layout']['annotations'], drawn['annotated'], annotated, annotations.get)
+    else:
+        fig['layout']['annotations'] = [annotations[driver] for driver in annotated]
+    fig['layout']['uirevision'] = str(selected_drivers)
+    return fig, dict(drawn, series_points=points, drivers=drivers, annotated=annotated)
+
+@figures.memoize(figure_version)
+def driver_standings_figure(selected_drivers, x_range, max_points):
+    snapshot = data.snapshot()
+    standings_data = snapshot['standings_data']
+    standings_by_driver = snapshot['standings_by_driver']
+    filtered_data = standings_data
+    if selected_drivers:
+        filtered_data = standings_by_driver.select(selected_drivers)
+
+    points = downsample.series_points(max_points, filtered_data['Driver'].nunique())
+    fig = standings_lines(filtered_data, points, x_range)
     fig.update_layout(
         xaxis=dict(title='Year', tickmode='linear', tick0=1950, dtick=5),
         yaxis=dict(title='Points'),
         legend=dict(title="Drivers", traceorder="normal"),
-        height=700
+        height=700,
+        # Keeps the user's zoom when the zoomed-in figure arrives
+        uirevision=str(selected_drivers)
     )
+    if x_range is not None:
+        fig.update_xaxes(range=list(x_range))
 
+    drivers = [trace.name for trace in fig.data]
+    annotated = []
     if selected_drivers:
         latest_year = standings_data['Year'].max()
-        for driver in filtered_data['Driver'].unique():
-            driver_data = filtered_data[filtered_data['Driver'] == driver]
-            latest_data = driver_data[driver_data['Year'] == latest_year]
-            if not latest_data.empty:
-                latest_points = latest_data['Points'].values[0]
-                fig.add_annotation(
-                    x=latest_year, y=latest_points,
-                    text=driver,
-                    showarrow=False
-                )
-
-    return fig
+        for driver in drivers:
+            annotation = standings_annotation(driver, standings_by_driver.get(driver), latest_year)
+            if annotation is not None:
+                fig.add_annotation(annotation)
+                annotated.append(driver)
+
+    # Only a figure of the whole range for chosen drivers can be patched
+    drawn = None
+    if selected_drivers and drivers and x_range is None:
+        drawn = {
+            'version': snapshot['data_version'], 'max_points': max_points, 'series_points': points,
+            'drivers': drivers, 'annotated': annotated
+        }
+    return fig, drawn
 
 @app.callback(
     [Output('race-dropdown', 'options'),
      Output('race-dropdown', 'value')],
-    Input('year-dropdown-lap', 'value')
+    Input('year-dropdown-lap', 'value'),
+    Input('lap-times-visible', 'data'),
+    prevent_initial_call=True
 )
-def update_race_dropdown(selected_year):
-    race_options = fetch_race_list(selected_year)
+def update_race_dropdown(selected_year, visible):
+    if not visible:
+        raise PreventUpdate
+    race_options = datasets.source.race_list(selected_year)
     return race_options, (race_options[0]['value'] if race_options else None)
 
 @app.callback(
     [Output('lap-times-chart', 'figure'),
      Output('fastest-lap-summary', 'children')],
     [Input('year-dropdown-lap', 'value'),
-     Input('race-dropdown', 'value')]
+     Input('race-dropdown', 'value'),
+     Input('lap-times-chart', 'relayoutData'),
+     Input('viewport-width', 'data')],
+    State('lap-times-visible', 'data'),
+    prevent_initial_call=True
 )
-def update_lap_times_chart(selected_year, selected_race):
+def update_lap_times_chart(selected_year, selected_race, relayout_data, width, visible):
+    if not visible:
+        raise PreventUpdate
+    max_points = downsample.point_budget(width)
+    x_range = zoomed_range(
+        'lap-times-chart', relayout_data,
+        lambda: lap_data.race_lap_times(selected_year, selected_race) if selected_race else pd.DataFrame({'Driver': []}),
+        max_points
+    )
+    return lap_times_figure(selected_year, selected_race, x_range, max_points)
+
+@figures.memoize(lap_figure_version, cacheable=has_traces)
+def lap_times_figure(selected_year, selected_race, x_range, max_points):
     if not selected_race:
         return go.Figure(), "<b>No race selected.</b>"
 
-    lap_times = fetch_lap_times(selected_year, selected_race)
+    lap_times = lap_data.race_lap_times(selected_year, selected_race)
     if lap_times.empty:
         return go.Figure(), "<b>No lap data available for the selected race.</b>"
 
@@ -722,8 +711,9 @@ def update_lap_times_chart(selected_year, selected_race):
         f"Lap: {fastest_lap['Lap']}, Time: {fastest_lap['Time']}"
     )
 
+    points = downsample.series_points(max_points, lap_times['Driver'].nunique())
     fig = px.line(
-        lap_times,
+        downsample.downsample(lap_times, 'Lap', 'Milliseconds', 'Driver', points, x_range),
         x='Lap',
         y='Milliseconds',
         color='Driver',
@@ -733,22 +723,36 @@ def update_lap_times_chart(selected_year, selected_race):
     )
 
     fig.update_layout(
-        xaxis=dict(title='Lap', tickmode='linear', range=[1, max_lap + 1]),
+        xaxis=dict(title='Lap', tickmode='linear', range=list(x_range or [1, max_lap + 1])),
         yaxis=dict(title='Time (ms)'),
         legend=dict(title="Drivers", traceorder="normal"),
-        height=600
+        height=600,
+        uirevision=f"{selected_year}-{selected_race}"
     )
 
     return fig, fastest_lap_summary
 
+@app.callback(
+    Output('qual-year-dropdown', 'options'),
+    Output('qual-year-dropdown', 'value'),
+    Input('qualifying-visible', 'data'),
+    prevent_initial_call=True
+)
+def update_qual_year_dropdown(_):
+    snapshot = data.snapshot()
+    years = sorted(snapshot['qualifying_race_data']['Year'].unique())
+    return [{'label': str(y), 'value': y} for y in years], snapshot['qual_default_year']
+
 @app.callback(
     Output('qual-driver-dropdown', 'options'),
     Output('qual-driver-dropdown', 'value'),
-    Input('qual-year-dropdown', 'value')
+    Input('qual-year-dropdown', 'value'),
+    prevent_initial_call=True
 )
 def update_qual_driver_dropdown(selected_year):
-    year = selected_year or qual_default_year
-    year_data = qualifying_race_data[qualifying_race_data['Year'] == year]
+    snapshot = data.snapshot()
+    year = selected_year or snapshot['qual_default_year']
+    year_data = snapshot['qualifying_by_year'].get(year)
     drivers = sorted(year_data['Driver'].unique())
 
     driver_options = [{'label': driver, 'value': driver} for driver in drivers]
@@ -757,19 +761,22 @@ def update_qual_driver_dropdown(selected_year):
 @app.callback(
     Output('qualifying-vs-race-chart', 'figure'),
     Input('qual-year-dropdown', 'value'),
-    Input('qual-driver-dropdown', 'value')
+    Input('qual-driver-dropdown', 'value'),
+    prevent_initial_call=True
 )
+@figures.memoize(figure_version)
 def update_qualifying_vs_race(selected_year, selected_drivers):
-    year = selected_year or qual_default_year
-    year_data = qualifying_race_data[qualifying_race_data['Year'] == year]
-
-    if not selected_drivers:
-        selected_drivers = year_data['Driver'].unique()
-
-    combined_data = pd.DataFrame()
-    for driver in selected_drivers:
-        driver_data = ensure_all_rounds_for_driver(year_data, year, driver)
-        combined_data = pd.concat([combined_data, driver_data])
+    snapshot = data.snapshot()
+    year = selected_year or snapshot['qual_default_year']
+    grid = snapshot['qualifying_grids'].get(year)
+
+    if grid is None:
+        combined_data = pd.DataFrame()
+    elif selected_drivers:
+        combined_data = grid.select(selected_drivers, keep_order=False)
+    else:
+        combined_data = grid.frame
+    combined_data = datasets.resolve_labels(combined_data)
 
     if combined_data.empty:
         return px.scatter(title="No data available for the selected filters.", template='plotly_dark')
@@ -798,4 +805,5 @@ def update_qualifying_vs_race(selected_year, selected_drivers):
     return fig
 
 if __name__ == '__main__':
+    refresher.start()
     app.run_server(debug=True, use_reloader=False, port=9923)
@@ -1,20 +1,19 @@
-import requests
 import pandas as pd
 from dash import Dash, dcc, html, Input, Output
 import plotly.express as px
 import plotly.graph_objects as go
 
+from ergast import client
+
 # Function to fetch driver standings data from the Ergast API
 def fetch_driver_standings():
     data = []
-    for year in range(1950, 2024):
-        url = f"http://ergast.com/api/f1/{year}/driverStandings.json?limit=1000"
-        response = requests.get(url)
-        if response.status_code != 200:
+    for year, page in client.fetch_seasons("{year}/driverStandings.json", range(1950, 2024), {'limit': 1000}):
+        if page is None:
             print(f"Failed to fetch data for {year}")
             continue
 
-        standings = response.json().get('MRData', {}).get('StandingsTable', {}).get('StandingsLists', [])
+        standings = page.get('MRData', {}).get('StandingsTable', {}).get('StandingsLists', [])
         for season in standings:
             season_year = season['season']
             for driver_standing in season['DriverStandings']:
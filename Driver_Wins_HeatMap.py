@@ -1,15 +1,14 @@
 from dash import Dash, dcc, html, Input, Output
 import pandas as pd
 import plotly.express as px
-import requests
+
+from ergast import client
 
 # Fetch race results (ensure this dataset includes all drivers and required fields)
 def fetch_race_results():
     data = []
-    for year in range(1950, 2024):  # Include years from 1950 to 2023
-        url = f"http://ergast.com/api/f1/{year}/results/1.json?limit=1000"
-        response = requests.get(url)
-        results = response.json()
+    # Include years from 1950 to 2023
+    for _, results in client.fetch_seasons("{year}/results/1.json", range(1950, 2024), {'limit': 1000}):
         try:
             races = results['MRData']['RaceTable']['Races']
             for race in races:
@@ -22,7 +21,7 @@ def fetch_race_results():
                     'name': winner['givenName'] + " " + winner['familyName'],
                     'positionOrder': 1  # Set 1 for winners
                 })
-        except (KeyError, IndexError):
+        except (KeyError, IndexError, TypeError):
             continue
     return pd.DataFrame(data)
 
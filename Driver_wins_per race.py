@@ -1,16 +1,12 @@
-import requests
 import pandas as pd
 import plotly.express as px
-import time
+
+from ergast import client
 
 # Fetch data for all races and their winners
 def fetch_race_winners():
     races = []
-    for year in range(1950, 2024):
-        url = f'http://ergast.com/api/f1/{year}/results.json?limit=1000'
-        response = requests.get(url)
-        time.sleep(1)  # Delay to avoid hitting API rate limits
-        data = response.json()
+    for year, data in client.fetch_seasons('{year}/results.json', range(1950, 2024), {'limit': 1000}):
         try:
             race_data = data['MRData']['RaceTable']['Races']
             for race in race_data:
@@ -26,7 +22,7 @@ def fetch_race_winners():
                     'Round': int(round_number),
                     'Winner': winner_name
                 })
-        except (IndexError, KeyError):
+        except (IndexError, KeyError, TypeError):
             print(f"No race data available for the year {year}")
     return pd.DataFrame(races)
 
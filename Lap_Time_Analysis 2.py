@@ -1,9 +1,10 @@
-import requests
 import pandas as pd
 from dash import Dash, dcc, html, Input, Output
 import plotly.express as px
 import plotly.graph_objects as go
 
+from ergast import client
+
 # Function to fetch lap times from the Ergast API with pagination
 def fetch_lap_times(year, race):
     lap_times = []
@@ -12,14 +13,13 @@ def fetch_lap_times(year, race):
 
     while True:
         # Fetch laps with pagination
-        url = f"http://ergast.com/api/f1/{year}/{race}/laps.json?limit={limit}&offset={offset}"
-        print(f"Fetching data from URL: {url}")
-        response = requests.get(url)
-        if response.status_code != 200:
-            print(f"Error: Unable to fetch data for {year}, Race {race}. Status Code: {response.status_code}")
+        path = f"{year}/{race}/laps.json"
+        print(f"Fetching data from URL: {client.url(path)}?limit={limit}&offset={offset}")
+        data = client.get_json(path, {'limit': limit, 'offset': offset})
+        if data is None:
+            print(f"Error: Unable to fetch data for {year}, Race {race}.")
             break
 
-        data = response.json()
         races = data.get('MRData', {}).get('RaceTable', {}).get('Races', [])
         if not races:
             print(f"No data found for {year}, Race {race}")
@@ -54,12 +54,10 @@ def fetch_lap_times(year, race):
 
 # Function to fetch the list of races for a given year
 def fetch_race_list(year):
-    url = f"http://ergast.com/api/f1/{year}.json"
-    response = requests.get(url)
-    if response.status_code != 200:
+    data = client.get_json(f"{year}.json")
+    if data is None:
         return []
 
-    data = response.json()
     races = data.get('MRData', {}).get('RaceTable', {}).get('Races', [])
     return [{'label': race['raceName'], 'value': int(race['round'])} for race in races]
 
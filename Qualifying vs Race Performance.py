@@ -1,18 +1,13 @@
-import time
-import requests
 import pandas as pd
 from dash import Dash, dcc, html, Input, Output
 import plotly.express as px
 
+from ergast import client
+
 # Fetch qualifying and race data for all years
 def fetch_qualifying_and_race_results(start_year=1950, end_year=2024):
     data = []
-    for year in range(start_year, end_year + 1):
-        url = f"http://ergast.com/api/f1/{year}/results.json?limit=1000"
-        response = requests.get(url)
-        time.sleep(0.5)  # Avoid API rate limits
-        year_data = response.json()
-
+    for year, year_data in client.fetch_seasons("{year}/results.json", range(start_year, end_year + 1), {'limit': 1000}):
         try:
             races = year_data['MRData']['RaceTable']['Races']
             for race in races:
@@ -32,7 +27,7 @@ def fetch_qualifying_and_race_results(start_year=1950, end_year=2024):
                         'Qualifying Position': qualifying_position,
                         'Race Position': race_position
                     })
-        except KeyError:
+        except (KeyError, TypeError):
             continue
 
     return pd.DataFrame(data)
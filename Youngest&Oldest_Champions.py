@@ -1,15 +1,14 @@
 from dash import Dash, dcc, html, Input, Output
 import pandas as pd
 import plotly.express as px
-import requests
 from datetime import datetime
 
+from ergast import client
+
 def fetch_championship_data():
     titles = []
-    for year in range(1950, 2024):  # Fetch data from 1950 to 2023
-        url = f"http://ergast.com/api/f1/{year}/driverStandings/1.json"
-        response = requests.get(url)
-        data = response.json()
+    # Fetch data from 1950 to 2023
+    for year, data in client.fetch_seasons("{year}/driverStandings/1.json", range(1950, 2024)):
         try:
             winner = data['MRData']['StandingsTable']['StandingsLists'][0]['DriverStandings'][0]['Driver']
             date_of_birth = datetime.strptime(winner['dateOfBirth'], '%Y-%m-%d')
@@ -20,7 +19,7 @@ def fetch_championship_data():
                 'Date of Birth': date_of_birth,
                 'Age': year - date_of_birth.year - ((datetime(year, 12, 31) < date_of_birth))
             })
-        except (KeyError, IndexError):
+        except (KeyError, IndexError, TypeError):
             continue
     return pd.DataFrame(titles)
 
@@ -0,0 +1,209 @@
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+
+import pyarrow as pa
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ====================================
+# Managed dataset artifact store
+#
+# Replaces the anonymous pickles that used to pile up in cache/. Every
+# dataset is written as an uncompressed Arrow IPC (Feather v2) file named
+# after the dataset and its parameters, so it can be memory-mapped back
+# with numeric columns shared rather than copied. manifest.json records
+# the schema version, creation time, size and source fingerprint of each
+# entry; entries are dropped when they outlive max_age, when the fingerprint
+# of the data they were built from changes, or, oldest first, when the
+# store grows past max_bytes. Pinned entries hold data that exists nowhere
+# else (rounds added by an incremental refresh) and are only dropped on a
+# schema change or by invalidate().
+#
+# Every process using cache/ (gunicorn workers storing lap races, the
+# refresher saving base tables) shares the manifest, so each change is made
+# to a fresh read of it under a file lock (fcntl, where available) rather
+# than to a copy read at startup.
+# ====================================
+
+SCHEMA_VERSION = 1
+STORE_DIR = os.environ.get(
+    'F1_ARTIFACT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+)
+MAX_STORE_BYTES = int(os.environ.get('F1_ARTIFACT_MAX_MB', 512)) * 1024 * 1024
+MAX_AGE = float(os.environ.get('F1_ARTIFACT_MAX_AGE_DAYS', 30)) * 24 * 3600
+
+
+def artifact_key(name, params):
+    parts = [name] + [f"{key}={params[key]}" for key in sorted(params)]
+    return re.sub(r'[^A-Za-z0-9_.=-]+', '_', '__'.join(parts))
+
+
+class ArtifactStore:
+    def __init__(self, root=STORE_DIR, max_bytes=MAX_STORE_BYTES, max_age=MAX_AGE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.lock_path = os.path.join(root, 'manifest.lock')
+        os.makedirs(root, exist_ok=True)
+        self.manifest = None
+        self.manifest_stamp = None
+        with self._locked():
+            pass
+
+    # Manifest
+    @contextlib.contextmanager
+    def _locked(self):
+        # Holds the thread and file locks with self.manifest up to date
+        with self.lock, open(self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            stamp = self._manifest_stamp()
+            if self.manifest is None or stamp != self.manifest_stamp:
+                self.manifest = self._read_manifest()
+                self.manifest_stamp = self._manifest_stamp()
+            yield
+
+    def _manifest_stamp(self):
+        try:
+            stat = os.stat(self.manifest_path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+        if not manifest or manifest.get('schema_version') != SCHEMA_VERSION:
+            # Unknown layout: start over rather than trust old files
+            manifest = {'schema_version': SCHEMA_VERSION, 'entries': {}}
+            self._remove_unlisted(manifest)
+            self.manifest = manifest
+            self._write_manifest()
+        return manifest
+
+    def _write_manifest(self):
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+        self.manifest_stamp = self._manifest_stamp()
+
+    def _remove_unlisted(self, manifest):
+        listed = {entry['file'] for entry in manifest['entries'].values()}
+        for filename in os.listdir(self.root):
+            if filename.endswith('.arrow') and filename not in listed:
+                os.remove(os.path.join(self.root, filename))
+
+    def _drop(self, key):
+        entry = self.manifest['entries'].pop(key, None)
+        if entry is not None:
+            try:
+                os.remove(os.path.join(self.root, entry['file']))
+            except FileNotFoundError:
+                pass
+
+    def _is_stale(self, entry, fingerprint):
+        if entry.get('schema_version') != SCHEMA_VERSION:
+            return True
+        if entry.get('pinned'):
+            return False
+        if fingerprint is not None and entry.get('fingerprint') != fingerprint:
+            return True
+        return time.time() - entry['created'] > self.max_age
+
+    # Public API
+    def get(self, name, fingerprint=None, **params):
+        key = artifact_key(name, params)
+        with self._locked():
+            entry = self.manifest['entries'].get(key)
+            if entry is None:
+                return None
+            if self._is_stale(entry, fingerprint):
+                self._drop(key)
+                self._write_manifest()
+                return None
+            path = os.path.join(self.root, entry['file'])
+        try:
+            with pa.memory_map(path, 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+        except (OSError, pa.ArrowInvalid):
+            with self._locked():
+                self._drop(key)
+                self._write_manifest()
+            return None
+        return table.to_pandas(split_blocks=True)
+
+    def put(self, name, df, fingerprint=None, pinned=False, **params):
+        key = artifact_key(name, params)
+        filename = f"{key}.arrow"
+        path = os.path.join(self.root, filename)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with self._locked():
+            # Written under the lock, so no other process lists the file
+            # before its entry exists or removes it as unlisted
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+            self.manifest['entries'][key] = {
+                'name': name,
+                'params': {k: str(v) for k, v in params.items()},
+                'file': filename,
+                'schema_version': SCHEMA_VERSION,
+                'created': time.time(),
+                'fingerprint': fingerprint,
+                'pinned': pinned,
+                'rows': len(df),
+                'columns': {column: str(dtype) for column, dtype in df.dtypes.items()},
+                'bytes': os.path.getsize(path)
+            }
+            self._evict()
+            self._write_manifest()
+
+    def get_or_build(self, name, build, fingerprint=None, **params):
+        df = self.get(name, fingerprint, **params)
+        if df is None:
+            df = build()
+            self.put(name, df, fingerprint, **params)
+        return df
+
+    def invalidate(self, name=None):
+        with self._locked():
+            for key, entry in list(self.manifest['entries'].items()):
+                if name is None or entry['name'] == name:
+                    self._drop(key)
+            self._write_manifest()
+
+    def size(self):
+        with self._locked():
+            return sum(entry['bytes'] for entry in self.manifest['entries'].values())
+
+    def _evict(self):
+        now = time.time()
+        entries = self.manifest['entries']
+        unpinned = [key for key, entry in entries.items() if not entry.get('pinned')]
+        for key in [key for key in unpinned if now - entries[key]['created'] > self.max_age]:
+            unpinned.remove(key)
+            self._drop(key)
+        # Pinned entries count towards the size but are never evicted
+        total = sum(entry['bytes'] for entry in entries.values())
+        for key in sorted(unpinned, key=lambda key: entries[key]['created']):
+            if total <= self.max_bytes:
+                break
+            total -= entries[key]['bytes']
+            self._drop(key)
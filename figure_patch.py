@@ -0,0 +1,44 @@
+# ====================================
+# Incremental figure updates
+#
+# Adding or removing a driver from a multi-select changes a few entries of
+# an already drawn figure (traces, heatmap rows, annotations). Instead of
+# redrawing the figure, the callback sends a Dash Patch with only those
+# entries. The callback keeps what it drew (the items in each list, in
+# order) in a dcc.Store next to the graph, so the next change can be
+# worked out from it.
+# ====================================
+
+
+def list_changes(old, new):
+    """Positions to delete from `old` and (position, item) pairs to insert
+    to turn it into `new`.
+
+    Items in both lists must be in the same relative order, as they are
+    when both are drawn sorted the same way. Deletions are in descending
+    order and insertions in ascending order, so they can be applied one
+    after another.
+    """
+    old_items, new_items = set(old), set(new)
+    removed = [i for i in range(len(old) - 1, -1, -1) if old[i] not in new_items]
+    added = [(i, item) for i, item in enumerate(new) if item not in old_items]
+    return removed, added
+
+
+def worth_patching(old, new):
+    # Clearing most of a list (say, from every driver down to one) costs
+    # more in deletions than sending the new figure
+    removed, added = list_changes(old, new)
+    return len(removed) + len(added) <= len(new)
+
+
+def patch_list(patch, old, new, make_entry):
+    """Add the changes from `old` to `new` to the Patch list `patch`.
+
+    `make_entry(item)` builds the entry for an inserted item.
+    """
+    removed, added = list_changes(old, new)
+    for i in removed:
+        del patch[i]
+    for i, item in added:
+        patch.insert(i, make_entry(item))
@@ -0,0 +1,32 @@
+import gc
+import os
+
+# ====================================
+# Production server settings (picked up automatically by `gunicorn Dashboard:server`)
+#
+# The app is imported once in the master with every dataset loaded, then
+# forked. Workers share those pages copy-on-write instead of each loading
+# its own copy; numeric columns read from the Arrow artifacts in cache/
+# are memory-mapped, so they stay shared page cache even when touched.
+# ====================================
+
+os.environ.setdefault('F1_WARM_DATASETS', 'sync')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+timeout = 120
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the GC's reach; otherwise its
+    # bookkeeping writes would copy the shared pages into every worker
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Threads do not survive the fork, so each worker runs its own
+    # scheduler; one of them refreshes and the rest reload what it saved
+    from Dashboard import refresher
+    refresher.start()
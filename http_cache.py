@@ -0,0 +1,158 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# ====================================
+# Persistent Ergast response cache
+#
+# Responses are stored in a SQLite file keyed by normalized URL. Finished
+# seasons never change, so their entries never expire; anything else
+# (the current season, circuits, race lists without a season) expires
+# after a short TTL and is revalidated with ETag/Last-Modified when the
+# server provides them. The file is capped in size with LRU eviction.
+# ====================================
+
+CACHE_PATH = os.environ.get(
+    'ERGAST_HTTP_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'ergast_http.sqlite')
+)
+CURRENT_SEASON_TTL = int(os.environ.get('ERGAST_HTTP_CACHE_TTL', 3600))
+MAX_CACHE_BYTES = int(os.environ.get('ERGAST_HTTP_CACHE_MAX_MB', 256)) * 1024 * 1024
+
+SEASON_PATTERN = re.compile(r'/((?:19|20)\d{2})(?:/|\.json|$)')
+
+
+def normalize_url(url, params=None):
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query += [(key, str(value)) for key, value in params.items()]
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/')
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(sorted(query)), ''))
+
+
+def season_of(url):
+    match = SEASON_PATTERN.search(urlsplit(url).path)
+    return int(match.group(1)) if match else None
+
+
+class CachedResponse:
+    def __init__(self, body, etag, last_modified, expires_at):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self):
+        return self.expires_at is None or self.expires_at > time.time()
+
+    def validators(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_CACHE_BYTES, current_season_ttl=CURRENT_SEASON_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.current_season_ttl = current_season_ttl
+        self.lock = threading.Lock()
+        self.stats = {
+            'hits': 0, 'misses': 0, 'stale': 0, 'revalidated': 0,
+            'bytes_read': 0, 'bytes_written': 0, 'evictions': 0
+        }
+
+        self._db = None
+        self._pid = None
+
+    @property
+    def db(self):
+        # SQLite connections must not cross a fork (gunicorn --preload), so
+        # each process opens its own
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'url TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, last_modified TEXT, '
+                'stored_at REAL NOT NULL, accessed_at REAL NOT NULL, expires_at REAL, size INTEGER NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+            self._pid = os.getpid()
+        return self._db
+
+    def ttl_for(self, url):
+        season = season_of(url)
+        if season is not None and season < datetime.now().year:
+            return None
+        return self.current_season_ttl
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT body, etag, last_modified, expires_at FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            entry = CachedResponse(*row)
+            if entry.fresh:
+                self.stats['hits'] += 1
+                self.stats['bytes_read'] += len(entry.body)
+                self.db.execute('UPDATE responses SET accessed_at = ? WHERE url = ?', (time.time(), url))
+            else:
+                self.stats['stale'] += 1
+            return entry
+
+    def store(self, url, body, headers):
+        ttl = self.ttl_for(url)
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, body, headers.get('ETag'), headers.get('Last-Modified'),
+                 now, now, None if ttl is None else now + ttl, len(body))
+            )
+            self.stats['bytes_written'] += len(body)
+            self._evict()
+
+    def revalidated(self, url):
+        # A 304 Not Modified extends the lifetime of the stored body
+        ttl = self.ttl_for(url)
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                'UPDATE responses SET accessed_at = ?, expires_at = ? WHERE url = ?',
+                (now, None if ttl is None else now + ttl, url)
+            )
+            self.stats['revalidated'] += 1
+
+    def size(self):
+        with self.lock:
+            return self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def _evict(self):
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.db.execute('SELECT url, size FROM responses ORDER BY accessed_at').fetchall()
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.db.execute('DELETE FROM responses WHERE url = ?', (url,))
+            total -= size
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.db.execute('DELETE FROM responses')
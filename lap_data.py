@@ -0,0 +1,303 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import datasets
+import ergast
+import f1_data
+
+# ====================================
+# Lap time loader
+#
+# Used for races not yet in the lap store below. Lap times for a race are
+# fetched at most once: they are kept in a bounded in-process LRU keyed by
+# (year, round) and persisted in the artifact store, so a race picked by
+# any user is served from memory the second time and from disk after a
+# restart. A fetch that comes back empty (failed, or no laps published yet)
+# is remembered for FAILED_FETCH_TTL seconds before Ergast is asked again.
+# ====================================
+
+LAP_CACHE_SIZE = 64
+FAILED_FETCH_TTL = float(os.environ.get('F1_LAP_RETRY_SECONDS', 60))
+
+logger = logging.getLogger(__name__)
+
+
+class LapTimeLoader:
+    def __init__(self, maxsize=LAP_CACHE_SIZE, store=datasets.store, failed_ttl=FAILED_FETCH_TTL):
+        self.maxsize = maxsize
+        self.store = store
+        self.failed_ttl = failed_ttl
+        self.cache = OrderedDict()
+        self.failed = {}
+        self.lock = threading.Lock()
+        self.loading = {}
+        self.stats = {'memory_hits': 0, 'store_hits': 0, 'fetches': 0, 'failed_hits': 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _cached(self, key):
+        # Called with self.lock held
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.stats['memory_hits'] += 1
+            return self.cache[key]
+        failed = self.failed.get(key)
+        if failed is not None:
+            if time.monotonic() < failed[0]:
+                self.stats['failed_hits'] += 1
+                return failed[1]
+            del self.failed[key]
+        return None
+
+    def _remember(self, key, df):
+        # Called with self.lock held
+        if df.empty:
+            self.failed[key] = (time.monotonic() + self.failed_ttl, df)
+            return
+        self.cache[key] = df
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+
+    def _load(self, year, rnd):
+        df = self.store.get('lap_times', year=year, round=rnd)
+        if df is not None:
+            self._count('store_hits')
+            return df
+        self._count('fetches')
+        df = ergast.lap_times(year, rnd)
+        if not df.empty:
+            self.store.put('lap_times', df, year=year, round=rnd)
+        return df
+
+    def get(self, year, rnd):
+        key = (int(year), int(rnd))
+        with self.lock:
+            df = self._cached(key)
+            if df is not None:
+                return df
+            # Concurrent requests for the same race wait for one load
+            key_lock = self.loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self.lock:
+                df = self._cached(key)
+                if df is not None:
+                    return df
+            try:
+                df = self._load(*key)
+                with self.lock:
+                    self._remember(key, df)
+            finally:
+                # Unregistered before key_lock is released, so a later
+                # request finds the result rather than a new lock
+                with self.lock:
+                    self.loading.pop(key, None)
+        return df
+
+
+loader = LapTimeLoader()
+
+
+# ====================================
+# Memory-mapped lap time store
+#
+# Every historical lap timing in one Arrow file: int16 raceId, driverId and
+# lap plus int32 milliseconds, sorted by race. The schema metadata holds an
+# offset index (raceId -> first row), so a race is a zero-copy slice of the
+# memory-mapped columns and multi-race queries never touch the network.
+# Built offline with `python lap_data.py`.
+# ====================================
+
+LAP_STORE_PATH = os.environ.get(
+    'F1_LAP_STORE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'lap_times.arrow')
+)
+
+LAP_STORE_SCHEMA = pa.schema([
+    ('raceId', pa.int16()),
+    ('driverId', pa.int16()),
+    ('lap', pa.int16()),
+    ('milliseconds', pa.int32()),
+])
+
+# Ergast has lap-by-lap timings from the 1996 season on
+FIRST_LAP_SEASON = 1996
+
+
+def format_lap_time(milliseconds):
+    # m:ss.mmm for every lap at once: the characters are written as digit
+    # bytes into one row per lap, then viewed as fixed-width strings
+    milliseconds = np.asarray(milliseconds, dtype=np.int64)
+    minutes, rest = np.divmod(milliseconds, 60000)
+    width = len(str(int(minutes.max(initial=0))))
+    chars = np.empty((len(milliseconds), width + 7), dtype=np.uint8)
+    for i, place in enumerate(10 ** np.arange(width - 1, -1, -1)):
+        # Leading zeros of shorter minutes become spaces, stripped below
+        chars[:, i] = np.where((minutes >= place) | (place == 1), ord('0') + minutes // place % 10, ord(' '))
+    chars[:, width] = ord(':')
+    for i, place in enumerate((10000, 1000)):
+        chars[:, width + 1 + i] = ord('0') + rest // place % 10
+    chars[:, width + 3] = ord('.')
+    for i, place in enumerate((100, 10, 1)):
+        chars[:, width + 4 + i] = ord('0') + rest // place % 10
+    times = chars.view(f"S{width + 7}").ravel().astype(str)
+    return np.char.lstrip(times) if width > 1 else times
+
+
+class LapStore:
+    def __init__(self, path=LAP_STORE_PATH):
+        stat = os.stat(path)
+        # Names this build of the store, for keying figures drawn from it
+        self.version = f"{stat.st_mtime_ns}-{stat.st_size}"
+        self.source = pa.memory_map(path, 'r')
+        table = pa.ipc.open_file(self.source).read_all()
+        index = json.loads(table.schema.metadata[b'race_index'])
+        self.race_ids = np.asarray(index['race_ids'], dtype=np.int64)
+        self.offsets = np.asarray(index['offsets'], dtype=np.int64)
+        self.positions = {race_id: i for i, race_id in enumerate(index['race_ids'])}
+        self.columns = {
+            name: table.column(name).chunk(0).to_numpy(zero_copy_only=True)
+            for name in LAP_STORE_SCHEMA.names
+        }
+        drivers = f1_data.load_table('drivers')
+        self.driver_refs = pd.Series(drivers['driverRef'].values, index=drivers['driverId'].values)
+
+    def __contains__(self, race_id):
+        return race_id in self.positions
+
+    def race_slice(self, race_id):
+        # Views into the memory map; nothing is read or copied until used
+        i = self.positions.get(race_id)
+        if i is None:
+            return None
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return {name: column[start:stop] for name, column in self.columns.items()}
+
+    def race(self, race_id):
+        laps = self.race_slice(race_id)
+        if laps is None:
+            return pd.DataFrame(columns=ergast.LAP_TIME_COLUMNS)
+        return pd.DataFrame({
+            'Driver': self.driver_refs.reindex(laps['driverId']).values,
+            'Lap': laps['lap'],
+            'Milliseconds': laps['milliseconds'],
+            'Time': format_lap_time(laps['milliseconds'])
+        })
+
+    def races(self, race_ids):
+        slices = [self.race_slice(race_id) for race_id in race_ids if race_id in self]
+        if not slices:
+            return pd.DataFrame(columns=LAP_STORE_SCHEMA.names)
+        return pd.DataFrame({
+            name: np.concatenate([laps[name] for laps in slices]) for name in LAP_STORE_SCHEMA.names
+        })
+
+    def circuit(self, circuit_id):
+        # The same circuit across every season in the store
+        races = f1_data.load_table('races')
+        return self.races(races.loc[races['circuitId'] == circuit_id, 'raceId'].sort_values())
+
+
+def open_lap_store(path=LAP_STORE_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        return LapStore(path)
+    except (OSError, KeyError, IndexError, ValueError, pa.ArrowInvalid):
+        logger.warning("Ignoring unreadable lap store %s", path)
+        return None
+
+
+lap_store = open_lap_store()
+
+
+def lap_store_version():
+    return lap_store.version if lap_store is not None else 'none'
+
+
+def race_id_for(year, rnd):
+    races = f1_data.load_table('races')
+    match = races.loc[(races['year'] == int(year)) & (races['round'] == int(rnd)), 'raceId']
+    return int(match.iloc[0]) if len(match) else None
+
+
+def race_lap_times(year, rnd):
+    race_id = race_id_for(year, rnd)
+    if lap_store is not None and race_id in lap_store:
+        return lap_store.race(race_id)
+    # Races newer than the store are fetched and memoized
+    return loader.get(year, rnd)
+
+
+# ====================================
+# Ingestion
+# ====================================
+
+def _lap_times_from_csv(path):
+    laps = pd.read_csv(path, usecols=['raceId', 'driverId', 'lap', 'milliseconds'])
+    return laps[LAP_STORE_SCHEMA.names]
+
+
+def _lap_times_from_ergast(today=None):
+    today = today or date.today()
+    races = f1_data.load_table('races')
+    races = races[(races['year'] >= FIRST_LAP_SEASON) & (pd.to_datetime(races['date']).dt.date <= today)]
+    driver_ids = f1_data.load_table('drivers').set_index('driverRef')['driverId']
+    frames = []
+    for race_id, year, rnd in zip(races['raceId'], races['year'], races['round']):
+        laps = ergast.lap_times(year, rnd)
+        if laps.empty:
+            continue
+        frames.append(pd.DataFrame({
+            'raceId': race_id,
+            'driverId': laps['Driver'].map(driver_ids),
+            'lap': laps['Lap'],
+            'milliseconds': laps['Milliseconds']
+        }).dropna())
+        logger.info("Ingested %d timings for %s round %s", len(laps), year, rnd)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=LAP_STORE_SCHEMA.names)
+
+
+def build_lap_store(laps, path=LAP_STORE_PATH):
+    laps = laps.astype({name: field.type.to_pandas_dtype() for name, field in zip(LAP_STORE_SCHEMA.names, LAP_STORE_SCHEMA)})
+    laps = laps.sort_values(['raceId', 'lap', 'driverId'], kind='stable')
+    race_col = laps['raceId'].to_numpy()
+    race_ids, starts = np.unique(race_col, return_index=True)
+    index = {'race_ids': race_ids.tolist(), 'offsets': starts.tolist() + [len(race_col)]}
+
+    table = pa.Table.from_pandas(laps, schema=LAP_STORE_SCHEMA, preserve_index=False)
+    table = table.replace_schema_metadata({'race_index': json.dumps(index)})
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            # A single record batch keeps every column one contiguous buffer
+            writer.write_table(table, max_chunksize=max(len(table), 1))
+    os.replace(tmp_path, path)
+    return len(table), len(race_ids)
+
+
+if __name__ == '__main__':
+    # python lap_data.py [lap_times.csv]
+    logging.basicConfig(level=logging.INFO)
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(f1_data.DATA_DIR, 'lap_times.csv')
+    if os.path.exists(csv_path):
+        laps = _lap_times_from_csv(csv_path)
+    else:
+        laps = _lap_times_from_ergast()
+    rows, races = build_lap_store(laps)
+    print(f"Wrote {rows} lap timings for {races} races to {LAP_STORE_PATH}")
@@ -0,0 +1,395 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import datasets
+import ergast
+import f1_data
+
+# ====================================
+# Incremental season refresh
+#
+# Instead of re-ingesting 1950 onwards, look up the newest race already
+# stored, ask Ergast only for the rounds completed since then, append their
+# rows to the base tables and patch the aggregate tables for the affected
+# drivers/constructors. A season's champions are only recorded once its
+# final round is in.
+# ====================================
+
+logger = logging.getLogger(__name__)
+
+
+def latest_stored_race(data):
+    return datasets.latest_race(data['qualifying_race_data'])
+
+
+def find_new_rounds(latest, client=ergast.client, today=None):
+    """List (year, round, is_final_round) for races run after `latest`."""
+    today = today or date.today()
+    last_year, last_round = latest
+    new_rounds = []
+    for year in range(last_year, today.year + 1):
+        schedule = client.get_json(f"{year}.json")
+        if schedule is None:
+            continue
+        races = schedule.get('MRData', {}).get('RaceTable', {}).get('Races', [])
+        final_round = max((int(race['round']) for race in races), default=0)
+        for race in races:
+            rnd = int(race['round'])
+            if (year, rnd) <= (last_year, last_round):
+                continue
+            if datetime.strptime(race['date'], '%Y-%m-%d').date() > today:
+                break
+            new_rounds.append((year, rnd, rnd == final_round))
+    return new_rounds
+
+
+def fetch_round_results(year, rnd, client=ergast.client):
+    data = client.get_json(f"{year}/{rnd}/results.json", {'limit': 1000})
+    try:
+        rows = ergast._parse_season_results(data)
+    except (KeyError, TypeError):
+        rows = []
+    return pd.DataFrame(rows, columns=f1_data.SEASON_RESULTS_COLUMNS)
+
+
+def fetch_driver_standings(year, rnd, client=ergast.client):
+    data = client.get_json(f"{year}/{rnd}/driverStandings.json", {'limit': 1000})
+    lists = (data or {}).get('MRData', {}).get('StandingsTable', {}).get('StandingsLists', [])
+    return lists[0]['DriverStandings'] if lists else []
+
+
+def fetch_constructor_champion(year, rnd, client=ergast.client):
+    data = client.get_json(f"{year}/{rnd}/constructorStandings/1.json")
+    try:
+        return data['MRData']['StandingsTable']['StandingsLists'][0]['ConstructorStandings'][0]['Constructor']['name']
+    except (IndexError, KeyError, TypeError):
+        return None
+
+
+# ====================================
+# Incremental aggregate updates
+# ====================================
+
+def _append(df, rows):
+    rows = pd.DataFrame(rows, columns=df.columns).astype(df.dtypes.to_dict())
+    return pd.concat([df, rows], ignore_index=True)
+
+
+def add_title(stats, key, holder, year):
+    stats = stats.copy()
+    match = stats.index[stats[key] == holder]
+    if len(match):
+        i = match[0]
+        years = stats.at[i, 'Years'].split(', ') + [str(year)]
+        stats.at[i, 'Titles'] += 1
+        stats.at[i, 'Years'] = ', '.join(sorted(years))
+        return stats
+    stats = _append(stats, [{key: holder, 'Titles': 1, 'Years': str(year)}])
+    return stats.sort_values(key, ignore_index=True)
+
+
+def add_nationality_title(stats, nationality, new_driver):
+    stats = stats.copy()
+    match = stats.index[stats['Nationality'] == nationality]
+    if len(match):
+        stats.at[match[0], 'Titles'] += 1
+        stats.at[match[0], 'Drivers'] += int(new_driver)
+        return stats
+    stats = _append(stats, [{'Nationality': nationality, 'Titles': 1, 'Drivers': 1}])
+    return stats.sort_values('Nationality', ignore_index=True)
+
+
+def add_first_title(sorted_data, row):
+    position = sorted_data['Age'].searchsorted(row['Age'], side='right')
+    new_row = pd.DataFrame([row], columns=sorted_data.columns).astype(sorted_data.dtypes.to_dict())
+    return pd.concat([sorted_data.iloc[:position], new_row, sorted_data.iloc[position:]], ignore_index=True)
+
+
+def record_driver_champion(data, year, standing):
+    driver = standing['Driver']
+    name = f"{driver['givenName']} {driver['familyName']}"
+    date_of_birth = datetime.strptime(driver['dateOfBirth'], '%Y-%m-%d')
+    row = {
+        'Year': year,
+        'Driver': name,
+        'Nationality': driver['nationality'],
+        'Date of Birth': date_of_birth,
+        'Age': year - date_of_birth.year - (datetime(year, 12, 31) < date_of_birth)
+    }
+    first_title = not (data['drivers_stats']['Driver'] == name).any()
+
+    data['championship_data'] = _append(data['championship_data'], [row])
+    data['driver_championship_data'] = _append(data['driver_championship_data'], [row])
+    data['drivers_stats'] = add_title(data['drivers_stats'], 'Driver', name, year)
+    data['driver_stats_by_nationality'] = add_nationality_title(
+        data['driver_stats_by_nationality'], row['Nationality'], first_title
+    )
+    if first_title:
+        datasets.add_champion_ages(data, add_first_title(data['sorted_data'], row))
+
+
+def record_constructor_champion(data, year, constructor):
+    data['constructor_data'] = _append(data['constructor_data'], [{'Year': year, 'Constructor': constructor}])
+    data['constructors_stats'] = add_title(data['constructors_stats'], 'Constructor', constructor, year)
+
+
+def _append_fact(data, table, rows):
+    datasets.add_dimension_labels(data, table, rows)
+    data[table] = _append(data[table], rows)
+
+
+def apply_round(data, year, results, standings, is_final=False, constructor_champion=None):
+    _append_fact(data, 'qualifying_race_data', f1_data.qualifying_view(results))
+    _append_fact(data, 'grand_prix_winners', f1_data.winners_view(results))
+    _append_fact(data, 'heatmap_data', f1_data.heatmap_view(results))
+
+    if standings:
+        # Season standings so far replace the previous round's
+        table = data['standings_data']
+        data['standings_data'] = table[table['Year'] != year].reset_index(drop=True)
+        _append_fact(data, 'standings_data', pd.DataFrame([{
+            'Year': year,
+            'Driver': f"{s['Driver']['givenName']} {s['Driver']['familyName']}",
+            'Points': float(s['points'])
+        } for s in standings]))
+
+    if is_final and standings:
+        record_driver_champion(data, year, standings[0])
+    if is_final and constructor_champion is not None:
+        record_constructor_champion(data, year, constructor_champion)
+
+
+def incremental_refresh(data, client=ergast.client, today=None):
+    """Return a copy of `data` with every race run since the newest stored one applied."""
+    start = time.perf_counter()
+    data = dict(data)
+    applied = []
+    for year, rnd, is_final in find_new_rounds(latest_stored_race(data), client, today):
+        results = fetch_round_results(year, rnd, client)
+        if results.empty:
+            # Results not published yet; pick this round up next time
+            break
+        standings = fetch_driver_standings(year, rnd, client)
+        constructor_champion = fetch_constructor_champion(year, rnd, client) if is_final else None
+        if not standings or (is_final and constructor_champion is None):
+            # Standings failed or not published yet; without them the
+            # round (and a final round's champions) would never be recorded
+            break
+        apply_round(data, year, results, standings, is_final, constructor_champion)
+        applied.append((year, rnd))
+    logger.info("Applied %d new rounds in %.2fs", len(applied), time.perf_counter() - start)
+    return data, applied
+
+
+# ====================================
+# Background refresh
+#
+# Runs incremental_refresh on a schedule inside the dashboard process. The
+# refreshed tables go into a new snapshot whose derived datasets are loaded
+# before it is published (see DatasetRegistry.swap), so callbacks keep
+# reading the previous snapshot until the new one is complete.
+#
+# Under gunicorn every worker runs a scheduler, but only the one holding
+# cache/refresh.lock talks to Ergast (the rate limits are per process).
+# It persists the refreshed tables and records the newest race, the race
+# after which each table last changed, and its stats in
+# cache/refresh_state.json; the other workers check that file and, when it
+# is ahead of them, publish a snapshot that reads the changed tables back
+# from the artifact store and carries over every dataset they do not reach.
+# The rest stay the pages shared with the gunicorn master. If the leader
+# exits, the next worker to try takes over.
+# ====================================
+
+# Minutes between refreshes; 0 disables the scheduler
+REFRESH_INTERVAL = float(os.environ.get('F1_REFRESH_INTERVAL_MINUTES', 0)) * 60
+REFRESH_LOCK_PATH = os.path.join(datasets.store.root, 'refresh.lock')
+REFRESH_STATE_PATH = os.path.join(datasets.store.root, 'refresh_state.json')
+
+# Tables incremental_refresh reads and patches
+REFRESHED_TABLES = list(datasets.BASE_TABLES) + [
+    'dimensions', 'driver_stats_by_nationality', 'constructors_stats', 'drivers_stats',
+    'sorted_data', 'youngest_champions', 'oldest_champions',
+]
+
+
+class RefreshScheduler:
+    def __init__(self, registry=datasets.registry, interval=REFRESH_INTERVAL, client=ergast.client, persist=True,
+                 lock_path=REFRESH_LOCK_PATH, state_path=REFRESH_STATE_PATH):
+        self.registry = registry
+        self.interval = interval
+        self.client = client
+        self.persist = persist
+        self.lock_path = lock_path
+        self.state_path = state_path
+        self.lock_file = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.stats = {
+            'refreshes': 0, 'failures': 0, 'rounds_applied': 0, 'reloads': 0,
+            'datasets_kept': None, 'datasets_reloaded': None,
+            'last_duration_seconds': None, 'last_run': None, 'last_success': None
+        }
+
+    @property
+    def leading(self):
+        # Without persisted tables there is nothing to follow
+        return not self.persist or fcntl is None or self.lock_file is not None
+
+    def try_lead(self):
+        if self.leading:
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        logger.info("Process %d is refreshing datasets", os.getpid())
+        return True
+
+    def read_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_state(self, changed=()):
+        latest = list(latest_stored_race(self.registry.snapshot()))
+        previous = self.read_state() or {}
+        # A state file without table races counts every table as changed
+        tables = previous.get('tables', {key: previous['latest_race'] for key in datasets.BASE_TABLES if previous})
+        tables.update((key, latest) for key in changed)
+        state = {
+            'pid': os.getpid(),
+            'latest_race': latest,
+            'tables': tables,
+            'stats': self.stats
+        }
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def refresh_once(self):
+        """Apply any new rounds and publish them; returns the rounds applied."""
+        start = time.perf_counter()
+        self.stats['last_run'] = time.time()
+        current = self.registry.snapshot()
+        changed = []
+        try:
+            data = {name: current[name] for name in REFRESHED_TABLES}
+            data, applied = incremental_refresh(data, self.client)
+            if applied:
+                # Circuits carry over; everything derived from the refreshed
+                # tables is rebuilt in the new snapshot
+                if current.ready('circuit_data'):
+                    data['circuit_data'] = current['circuit_data']
+                self.registry.swap(data, warm=datasets.WARM_ORDER)
+                # Tables a round did not touch are still the same frames
+                changed = [key for key in datasets.BASE_TABLES if data[key] is not current[key]]
+                if self.persist:
+                    datasets.save_base_tables(data, changed)
+        except Exception:
+            self.stats['failures'] += 1
+            logger.exception("Dataset refresh failed")
+            return []
+        finally:
+            self.stats['last_duration_seconds'] = time.perf_counter() - start
+        self.stats['refreshes'] += 1
+        self.stats['rounds_applied'] += len(applied)
+        self.stats['last_success'] = time.time()
+        if self.persist:
+            self._write_state(changed)
+        return applied
+
+    def follow_once(self):
+        """Publish the tables the leading process persisted, if they are newer."""
+        state = self.read_state()
+        current = self.registry.snapshot()
+        latest = latest_stored_race(current)
+        if state is None or tuple(state['latest_race']) <= latest:
+            return False
+        # Tables that changed after the newest race this process has (all
+        # of them for a state file that does not say) are read back from
+        # the artifact store; datasets built only from the others carry over
+        tables = state.get('tables', {key: state['latest_race'] for key in datasets.BASE_TABLES})
+        changed = [key for key in tables if tuple(tables[key]) > latest]
+        affected = self.registry.affected(changed)
+        kept = {name: value for name, value in dict(current.values).items() if name not in affected}
+        try:
+            self.registry.swap(kept, warm=datasets.WARM_ORDER)
+        except Exception:
+            self.stats['failures'] += 1
+            logger.exception("Reloading refreshed datasets failed")
+            return False
+        self.stats['reloads'] += 1
+        self.stats['datasets_kept'] = len(kept)
+        self.stats['datasets_reloaded'] = len(affected.intersection(self.registry.loaders))
+        return True
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            if self.try_lead():
+                self.refresh_once()
+            else:
+                self.follow_once()
+
+    def start(self):
+        if self.interval <= 0 or (self.thread is not None and self.thread.is_alive()):
+            return self.thread
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='dataset-refresh', daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self):
+        self.stop_event.set()
+
+    def metrics(self):
+        snapshot = self.registry.snapshot()
+        now = time.time()
+        # Data is as fresh as the last successful check, even when it found
+        # nothing new; before the first one, as old as the snapshot
+        stats = self.stats
+        leader = None
+        if not self.leading:
+            # The refresh itself is reported by the leading process
+            state = self.read_state()
+            if state is not None:
+                stats, leader = state['stats'], state['pid']
+        checked = stats['last_success'] or snapshot.created
+        metrics = dict(stats, reloads=self.stats['reloads'])
+        metrics.update({
+            'role': 'leader' if self.leading else 'follower',
+            'leader_pid': os.getpid() if self.leading else leader,
+            'interval_seconds': self.interval,
+            'running': self.thread is not None and self.thread.is_alive(),
+            'snapshot_version': snapshot.version,
+            'snapshot_age_seconds': now - snapshot.created,
+            'data_age_seconds': now - checked,
+        })
+        if snapshot.ready('qualifying_race_data'):
+            metrics['latest_race'] = list(latest_stored_race(snapshot))
+        return metrics
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    data = datasets.build()
+    data, applied = incremental_refresh(data)
+    if applied:
+        datasets.save_base_tables(data)
+    print(f"Applied rounds: {applied or 'none'}")
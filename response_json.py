@@ -0,0 +1,102 @@
+import logging
+import os
+import threading
+import time
+import uuid
+
+import dash._callback
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+from flask import has_request_context
+
+from compression import response_name
+
+# ====================================
+# Callback response encoding
+#
+# Dash encodes every callback response with plotly's JSON encoder. Here
+# that encoder is pinned to orjson (checked at startup, since plotly quietly
+# falls back to the much slower json module without it), the encoding is
+# timed per callback output for /metrics, and values that are already JSON
+# (RawJSON, as the figure cache returns them) are written into the
+# response as-is instead of being decoded and encoded again.
+# ====================================
+
+ENGINE = os.environ.get('F1_JSON_ENGINE', 'orjson')
+
+logger = logging.getLogger(__name__)
+
+
+class RawJSON:
+    """A callback output already encoded as JSON."""
+
+    __slots__ = ('body',)
+
+    def __init__(self, body):
+        self.body = body
+
+
+class ResponseEncoder:
+    def __init__(self, engine=ENGINE):
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.stats = {}
+        # Stands in for RawJSON values while the rest is encoded
+        self.placeholder = f"raw-json-{uuid.uuid4().hex}"
+
+    def configure(self):
+        """Set plotly's JSON engine and check that figures take its fast path."""
+        try:
+            pio.json.config.default_engine = self.engine
+        except ValueError:
+            logger.warning("JSON engine %s is not available (is orjson installed?); using json", self.engine)
+            self.engine = pio.json.config.default_engine = 'json'
+        if self.engine == 'orjson':
+            import orjson
+
+            # Raises TypeError if NumPy arrays are not written directly, in
+            # which case plotly would clean every figure before encoding it
+            sample = go.Figure(go.Scatter(x=np.arange(3), y=np.linspace(0, 1, 3))).to_plotly_json()
+            orjson.dumps(sample, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        logger.info("Encoding callback responses with %s", self.engine)
+        return self.engine
+
+    def install(self):
+        self.configure()
+        dash._callback.to_json = self.encode
+
+    def encode(self, response):
+        start = time.perf_counter()
+        raw = []
+        for props in (response.get('response') or {}).values() if isinstance(response, dict) else ():
+            for prop, value in props.items():
+                if isinstance(value, RawJSON):
+                    props[prop] = f"{self.placeholder}-{len(raw)}"
+                    raw.append(value.body)
+
+        body = pio.json.to_json_plotly(response)
+        for i, value in enumerate(raw):
+            body = body.replace(f'"{self.placeholder}-{i}"', value, 1)
+
+        name = response_name() if has_request_context() else 'unknown'
+        self._record(name, len(body), sum(len(value) for value in raw), time.perf_counter() - start)
+        return body
+
+    def _record(self, name, size, raw_size, seconds):
+        with self.lock:
+            counts = self.stats.setdefault(
+                name, {'responses': 0, 'bytes': 0, 'raw_bytes': 0, 'encode_seconds': 0.0}
+            )
+            counts['responses'] += 1
+            counts['bytes'] += size
+            counts['raw_bytes'] += raw_size
+            counts['encode_seconds'] += seconds
+
+    def metrics(self):
+        with self.lock:
+            callbacks = {name: dict(counts) for name, counts in self.stats.items()}
+        return {'engine': self.engine, 'callbacks': callbacks}
+
+
+encoder = ResponseEncoder()
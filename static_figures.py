@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import threading
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+import datasets
+
+# ====================================
+# Prebuilt static figures
+#
+# The championship, circuits, Grand Prix winners, constructors, nationality
+# and youngest/oldest charts take no user input, so they are rendered once to
+# compact JSON files in cache/static_figures/ (python static_figures.py,
+# or on first use) and the dashboard serves the stored figure as-is. Each
+# file records the data version and figure REVISION it was drawn with;
+# after a refresh the first request redraws it and writes the new version
+# back for every worker.
+# ====================================
+
+FIGURE_DIR = os.environ.get(
+    'F1_FIGURE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'static_figures')
+)
+
+# Bump when a figure below changes, so files drawn by older code are redrawn
+REVISION = 4
+
+logger = logging.getLogger(__name__)
+
+
+# ====================================
+# Figures
+# ====================================
+
+def championship_chart(data):
+    drivers_stats = data['drivers_stats'].sort_values(by='Titles', ascending=False)
+    return px.bar(
+        drivers_stats,
+        x='Driver',
+        y='Titles',
+        text='Titles',
+        title='World Drivers Championships (1950-2024)',
+        labels={'Titles': 'Number of Titles', 'Driver': 'Driver'},
+        color='Titles',
+        hover_data={'Years': True},
+        color_continuous_scale='Viridis',
+        category_orders={'Driver': drivers_stats['Driver']},
+        template='plotly_dark'
+    ).update_layout(xaxis_tickangle=-45, margin={'l': 50, 'r': 50, 't': 50, 'b': 150})
+
+
+def circuits_map(data):
+    return px.scatter_geo(
+        data['circuit_data'],
+        lat='Latitude',
+        lon='Longitude',
+        hover_name='CircuitName',
+        hover_data={'Locality': True, 'Country': True},
+        projection="natural earth",
+        title="Formula 1 Circuits Around the World",
+        template='plotly_dark'
+    ).update_layout(margin={"r":0,"t":40,"l":0,"b":0})
+
+
+def grand_prix_winners_chart(data):
+    # One WebGL trace instead of a px.scatter trace per driver. Races are
+    # sent as integer rows labelled through the axis ticks, and drivers as
+    # integer indexes into the template colours, assigned in the same order
+    # px would (first win first), so the chart looks the same. Each point's
+    # driver code is in customdata and the names are sent once, in meta;
+    # the dashboard turns the codes back into names for the hover and adds
+    # the driver legend in the browser.
+    winners = data['grand_prix_winners']
+    drivers = list(winners['Driver'].unique())
+    driver_index = pd.Categorical(winners['Driver'], categories=drivers).codes
+
+    # px stacks the category axis trace by trace: each driver's races in
+    # order, new ones appended
+    by_driver = winners.assign(driver_index=driver_index).sort_values('driver_index', kind='stable')
+    races = list(by_driver['Race'].unique())
+    race_rows = pd.Categorical(winners['Race'], categories=races).codes
+
+    colorway = pio.templates['plotly_dark'].layout.colorway
+    colorscale = [
+        [(i + step) / len(colorway), colour]
+        for i, colour in enumerate(colorway) for step in (0, 1)
+    ]
+
+    fig = go.Figure(go.Scattergl(
+        x=winners['Year'].to_numpy(),
+        y=race_rows,
+        mode='markers',
+        customdata=driver_index,
+        meta={'drivers': drivers},
+        showlegend=False,
+        marker=dict(
+            color=driver_index % len(colorway),
+            colorscale=colorscale,
+            cmin=-0.5,
+            cmax=len(colorway) - 0.5
+        ),
+        hovertemplate='Winner=%{text}<br>Year=%{x}<br>Grand Prix=%{customdata}<extra></extra>'
+    ))
+    return fig.update_layout(
+        title='Formula 1 Grand Prix Winners (1950-2024)',
+        template='plotly_dark',
+        height=1200,
+        legend=dict(title='Winner'),
+        yaxis=dict(
+            title='Grand Prix',
+            tickmode='array',
+            tickvals=list(range(len(races))),
+            ticktext=races,
+            tickfont=dict(size=8),
+            automargin=True
+        ),
+        xaxis=dict(title='Year'),
+        margin={'l': 150, 'r': 50, 't': 50, 'b': 50}
+    )
+
+
+def nationality_chart(data):
+    # Drawn as a sunburst; the dashboard switches the trace type to treemap
+    # in the browser, since both share the same ids, parents and values
+    return px.sunburst(
+        data['championship_data'],
+        path=['Nationality', 'Driver', 'Year'],
+        title="Driver Championships by Nationality",
+        hover_data={'Year': True},
+        template='plotly_dark'
+    )
+
+
+def constructors_chart(data):
+    constructors_stats = data['constructors_stats'].sort_values(by='Titles', ascending=False)
+    return px.bar(
+        constructors_stats,
+        x='Constructor',
+        y='Titles',
+        text='Titles',
+        title='World Constructors Championships (1950-2024)',
+        labels={'Titles': 'Number of Titles', 'Constructor': 'Constructor'},
+        hover_data={'Years': True},
+        color='Titles',
+        color_continuous_scale='Cividis',
+        category_orders={'Constructor': constructors_stats['Constructor']},
+        template='plotly_dark'
+    ).update_layout(xaxis_tickangle=-45, margin={'l': 50, 'r': 50, 't': 50, 'b': 150})
+
+
+def _champion_ages_chart(champions, title):
+    fig = px.bar(
+        champions,
+        x='Age',
+        y='Driver',
+        orientation='h',
+        color='Nationality',
+        text='Year',
+        title=title,
+        hover_data={'Driver': True, 'Age': True, 'Year': True, 'Nationality': True},
+        template='plotly_dark'
+    )
+    fig.update_layout(
+        yaxis=dict(categoryorder='total ascending'),
+        xaxis_title="Age",
+        yaxis_title="Driver"
+    )
+    return fig
+
+
+def youngest_champions_chart(data):
+    return _champion_ages_chart(data['youngest_champions'], "Top 10 Youngest F1 Champions")
+
+
+def oldest_champions_chart(data):
+    return _champion_ages_chart(data['oldest_champions'], "Top 10 Oldest F1 Champions")
+
+
+FIGURES = {
+    'championship': championship_chart,
+    'circuits': circuits_map,
+    'grand_prix_winners': grand_prix_winners_chart,
+    'constructors': constructors_chart,
+    'nationality': nationality_chart,
+    'youngest_champions': youngest_champions_chart,
+    'oldest_champions': oldest_champions_chart,
+}
+
+
+# ====================================
+# Figure files
+# ====================================
+
+class StaticFigures:
+    def __init__(self, root=FIGURE_DIR):
+        self.root = root
+        self.figures = {}
+        self.lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.root, f"{name}.json")
+
+    def _read(self, name):
+        try:
+            with open(self.path(name), 'rb') as f:
+                stored = pio.json.from_json_plotly(f.read())
+        except (OSError, ValueError):
+            return None
+        return stored['data_version'], stored['figure']
+
+    def _write(self, name, version, figure_json):
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(f'{{"data_version": {json.dumps(version)}, "figure": {figure_json}}}')
+        os.replace(tmp_path, path)
+
+    def version(self, data):
+        return f"{data['data_version']}/{REVISION}"
+
+    def render(self, name, data):
+        figure_json = pio.to_json(FIGURES[name](data), validate=False)
+        self._write(name, self.version(data), figure_json)
+        return pio.json.from_json_plotly(figure_json)
+
+    def preload(self):
+        # Startup: only reads the files; versions are checked on use
+        for name in FIGURES:
+            stored = self._read(name)
+            if stored is not None:
+                self.figures[name] = stored
+
+    def get(self, name, data):
+        version = self.version(data)
+        stored = self.figures.get(name)
+        if stored is None or stored[0] != version:
+            # Another worker may already have redrawn it
+            stored = self._read(name)
+            if stored is None or stored[0] != version:
+                logger.info("Rendering static figure %s", name)
+                stored = (version, self.render(name, data))
+            with self.lock:
+                self.figures[name] = stored
+        return stored[1]
+
+    def build(self, data):
+        for name in FIGURES:
+            self.render(name, data)
+
+
+prebuilt = StaticFigures()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    prebuilt.build(datasets.registry.snapshot())
+    for name in FIGURES:
+        print(f"{prebuilt.path(name)}: {os.path.getsize(prebuilt.path(name))} bytes")
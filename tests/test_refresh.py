@@ -0,0 +1,132 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import datasets
+import ergast
+import refresh
+from artifact_store import ArtifactStore
+from ergast_server import ErgastStandIn
+
+# ====================================
+# Incremental refresh against a full rebuild
+#
+# The stored tables are cut back to an earlier round, the rounds after it
+# are applied from the stand-in Ergast server (which serves the same
+# Data/*.csv the rebuild reads) and the result must match the rebuild.
+# ====================================
+
+SEASON = 2023
+END_OF_SEASON = date(SEASON, 12, 31)
+
+# Tables with one row per season rather than per race
+SEASON_TABLES = ['championship_data', 'constructor_data', 'driver_championship_data', 'standings_data']
+AGGREGATES = ['drivers_stats', 'constructors_stats', 'driver_stats_by_nationality', 'sorted_data']
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    # Builds into a temporary store, never the real cache/
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(datasets, 'store', ArtifactStore(tmp_path_factory.mktemp('artifacts')))
+        yield datasets.store
+
+
+@pytest.fixture(scope='module')
+def full(store):
+    return datasets.build()
+
+
+@pytest.fixture(scope='module')
+def stand_in():
+    server = ErgastStandIn().start()
+    yield server
+    server.stop()
+
+
+class FailingClient(ergast.ErgastClient):
+    """Answers None, as a failed request does, for paths containing `failing`."""
+
+    def __init__(self, base_url, failing):
+        super().__init__(base_url=base_url, rate_limits=((1000, 1.0),))
+        self.failing = failing
+
+    def get_json(self, path, params=None):
+        if any(part in path for part in self.failing):
+            return None
+        return super().get_json(path, params)
+
+
+def cut_back(data, year, rnd):
+    """`data` as stored after round `rnd` of `year`, before its champions were known."""
+    data = dict(data)
+    for table in SEASON_TABLES:
+        data[table] = data[table][data[table]['Year'] < year].reset_index(drop=True)
+
+    races = data['qualifying_race_data']
+    data['qualifying_race_data'] = races[
+        (races['Year'] < year) | ((races['Year'] == year) & (races['Round'] <= rnd))
+    ].reset_index(drop=True)
+    # Winners are stored one per race, in round order
+    for table, column in (('grand_prix_winners', 'Year'), ('heatmap_data', 'year')):
+        df = data[table]
+        kept = (df[column] < year) | ((df[column] == year) & (df.groupby(column).cumcount() < rnd))
+        data[table] = df[kept].reset_index(drop=True)
+    return datasets.add_aggregates(data)
+
+
+def up_to(data, year):
+    data = dict(data)
+    for table in SEASON_TABLES + ['qualifying_race_data', 'grand_prix_winners']:
+        data[table] = data[table][data[table]['Year'] <= year]
+    data['heatmap_data'] = data['heatmap_data'][data['heatmap_data']['year'] <= year]
+    return datasets.add_aggregates(data)
+
+
+def assert_same(refreshed, expected):
+    for table in SEASON_TABLES + ['qualifying_race_data', 'grand_prix_winners', 'heatmap_data'] + AGGREGATES:
+        left = datasets.resolve_labels(refreshed[table])
+        right = datasets.resolve_labels(expected[table])
+        columns = list(right.columns)
+        pd.testing.assert_frame_equal(
+            left.sort_values(columns, ignore_index=True),
+            right.sort_values(columns, ignore_index=True),
+            check_dtype=False,
+            obj=table
+        )
+
+
+def client_for(stand_in, failing=()):
+    return FailingClient(stand_in.base_url, failing)
+
+
+def test_refresh_whole_season(full, stand_in):
+    data = cut_back(full, SEASON, 0)
+    refreshed, applied = refresh.incremental_refresh(data, client_for(stand_in), END_OF_SEASON)
+    assert applied == [(SEASON, rnd) for rnd in range(1, 23)]
+    assert_same(refreshed, up_to(full, SEASON))
+
+
+def test_refresh_final_round(full, stand_in):
+    data = cut_back(full, SEASON, 21)
+    refreshed, applied = refresh.incremental_refresh(data, client_for(stand_in), END_OF_SEASON)
+    assert applied == [(SEASON, 22)]
+    assert_same(refreshed, up_to(full, SEASON))
+
+
+@pytest.mark.parametrize('failing', [
+    ['/22/driverStandings'],
+    ['/22/constructorStandings'],
+    ['/22/driverStandings', '/22/constructorStandings'],
+])
+def test_failed_standings_are_retried(full, stand_in, failing):
+    data = cut_back(full, SEASON, 21)
+    refreshed, applied = refresh.incremental_refresh(data, client_for(stand_in, failing), END_OF_SEASON)
+    assert applied == []
+    assert refresh.latest_stored_race(refreshed) == (SEASON, 21)
+
+    # The next refresh, with the standings back, records the champions
+    refreshed, applied = refresh.incremental_refresh(refreshed, client_for(stand_in), END_OF_SEASON)
+    assert applied == [(SEASON, 22)]
+    assert_same(refreshed, up_to(full, SEASON))